@@ -0,0 +1,6 @@
+"""Hardware free benchmarks, run from the src directory:
+
+python -m midirouter.benchmarks             full suite compared to the baseline
+python -m midirouter.benchmarks.midi_out    midi output paths
+python -m midirouter.benchmarks.routing     route rules overhead
+"""
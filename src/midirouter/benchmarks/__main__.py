@@ -0,0 +1,3 @@
+from midirouter.benchmarks.suite import main
+
+main()
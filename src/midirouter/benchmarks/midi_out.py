@@ -0,0 +1,56 @@
+import argparse
+import time
+
+import mido
+
+from midirouter.benchmarks.virtual import VirtualMidiDevice
+from midirouter.midi import NOTE_ON
+
+CHORD = (60, 64, 67, 71)
+CHANNEL = 15
+VELOCITY = 100
+
+
+def measure(send_chord, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        send_chord()
+    elapsed = time.perf_counter() - started
+    return iterations * len(CHORD) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MIDI output paths throughput")
+    parser.add_argument("--iterations", type=int, default=50000)
+    options = parser.parse_args()
+
+    device = VirtualMidiDevice(pattern="benchmark", channel=CHANNEL)
+    status = NOTE_ON[CHANNEL]
+
+    def mido_messages():
+        for note in CHORD:
+            device.send(
+                mido.Message(
+                    type="note_on", channel=CHANNEL, note=note, velocity=VELOCITY
+                )
+            )
+
+    def raw_batch():
+        device.send_batch([(status, note, VELOCITY) for note in CHORD])
+
+    def raw_notes():
+        device.send_notes(status, CHORD, VELOCITY)
+
+    baseline = None
+    for name, send_chord in (
+        ("mido.Message", mido_messages),
+        ("send_batch", raw_batch),
+        ("send_notes", raw_notes),
+    ):
+        rate = measure(send_chord, options.iterations)
+        baseline = baseline or rate
+        print(f"{name:<14} {rate:>12,.0f} msg/s {rate / baseline:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import logging
+import time
+
+from midirouter.benchmarks import streams
+from midirouter.benchmarks.virtual import VirtualMidiDevice
+from midirouter.routers.base import BaseRouter
+
+# Message rate the per message overhead is reported for
+RATE = 10000
+
+CONFIGS = {
+    "thru": None,
+    "filter": [{"types": ["note_on", "note_off"]}],
+    "split": [
+        {"notes": [0, 59], "transpose": -12, "channel": 1, "out": [0]},
+        {"notes": [60, 127], "channel": 2, "out": [1]},
+        {"types": ["control_change", "clock"]},
+    ],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BaseRouter per message overhead")
+    parser.add_argument("--messages", type=int, default=200000)
+    options = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    messages = streams.mixed(options.messages)
+
+    for name, rules in CONFIGS.items():
+        outputs = [VirtualMidiDevice(pattern=f"out{idx}") for idx in range(2)]
+        router = BaseRouter(VirtualMidiDevice(), outputs, rules=rules)
+
+        started = time.perf_counter()
+        for message in messages:
+            router.on_message(message)
+        elapsed = time.perf_counter() - started
+
+        per_message = elapsed / len(messages)
+        sent = sum(out.sent for out in outputs)
+        print(
+            f"{name:<8} {per_message * 1e6:>6.2f} us/msg "
+            f"{per_message * RATE * 100:>5.1f}% cpu at {RATE} msg/s "
+            f"{sent / len(messages):>4.2f} sends/msg"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Time from import to the first routed message, run in a fresh interpreter.
+
+python -m midirouter.benchmarks.startup base
+python -m midirouter.benchmarks.startup push2
+"""
+
+import time
+
+STARTED = time.perf_counter()
+
+import asyncio  # noqa: E402
+import json  # noqa: E402
+import sys  # noqa: E402
+
+import mido  # noqa: E402
+
+
+async def first_message(router_name):
+    import route
+
+    imported = time.perf_counter()
+
+    from midirouter.benchmarks.virtual import (
+        VirtualMidiDevice,
+        VirtualPush2Device,
+        VirtualPush2Display,
+    )
+
+    app = route.RouterApplication()
+    if router_name == "push2":
+        in_device = VirtualPush2Device(dispatch="loop")
+        message = mido.Message("note_on", note=36, velocity=100)
+    else:
+        in_device = VirtualMidiDevice(pattern="in")
+        message = mido.Message("note_on", note=60, velocity=100)
+    out_device = VirtualMidiDevice(pattern="out", channel=15)
+
+    router = app.create_router(router_name, in_device, [out_device], route="startup")
+    router.DISPLAY_CLASS = VirtualPush2Display
+    task = asyncio.create_task(router.run())
+    await asyncio.sleep(0)
+
+    in_device.inject(message)
+    while not out_device.sent:
+        await asyncio.sleep(0)
+    routed = time.perf_counter()
+    if router_name == "push2":
+        router.on_display_disconnected()
+    task.cancel()
+
+    return {
+        "import_ms": (imported - STARTED) * 1000,
+        "first_message_ms": (routed - STARTED) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(first_message(sys.argv[1]))))
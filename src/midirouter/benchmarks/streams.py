@@ -0,0 +1,59 @@
+import mido
+
+
+def notes(count, channel=0, low=36, high=84):
+    """Alternating note on and off messages walking up a note range"""
+    messages = []
+    for idx in range(count):
+        note = low + (idx // 2) % (high - low)
+        msg_type = "note_on" if idx % 2 == 0 else "note_off"
+        messages.append(
+            mido.Message(msg_type, channel=channel, note=note, velocity=100)
+        )
+    return messages
+
+
+def cc_flood(count, channel=0, controls=(1, 74, 71)):
+    """Controller sweeps as sent by encoders and touch strips"""
+    return [
+        mido.Message(
+            "control_change",
+            channel=channel,
+            control=controls[idx % len(controls)],
+            value=idx % 128,
+        )
+        for idx in range(count)
+    ]
+
+
+def clock(count):
+    """24 ppqn clock with start and stop around it"""
+    return (
+        [mido.Message("start")]
+        + [mido.Message("clock") for _ in range(count)]
+        + [mido.Message("stop")]
+    )
+
+
+def mixed(count):
+    """Notes, controllers and clock interleaved as on a busy stage"""
+    streams = (notes(count // 2), cc_flood(count // 4), clock(count // 4))
+    messages = []
+    for group in zip(*streams):
+        messages.extend(group)
+    return messages
+
+
+def chord_storm(count):
+    """Push 2 pads held while chord modifier pads are hammered"""
+    messages = []
+    for idx in range(count // 4):
+        pad = 36 + (idx * 5) % 48
+        modifier = 84 + idx % 16
+        messages += [
+            mido.Message("note_on", note=pad, velocity=100),
+            mido.Message("note_on", note=modifier, velocity=100),
+            mido.Message("note_off", note=modifier, velocity=0),
+            mido.Message("note_off", note=pad, velocity=0),
+        ]
+    return messages
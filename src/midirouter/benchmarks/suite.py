@@ -0,0 +1,461 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+import mido
+
+from midirouter import metrics
+from midirouter.benchmarks import streams
+from midirouter.benchmarks.routing import CONFIGS
+from midirouter.benchmarks.virtual import VirtualMidiDevice
+from midirouter.routers.base import BaseRouter
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Directory of route.py, startup runs there like the service does
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# Metrics where a larger value is better, all others regress when growing
+HIGHER_IS_BETTER = ("throughput", "fps")
+
+SCENARIOS = {}
+
+
+def scenario(func):
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+def latency_summary(prefix, name):
+    summary = metrics.histogram(name).snapshot()
+    return {
+        f"{prefix}_p50_us": summary["p50"],
+        f"{prefix}_p99_us": summary["p99"],
+        f"{prefix}_max_us": summary["max"],
+    }
+
+
+def route_messages(rules, messages, options=None):
+    metrics.reset()
+    in_device = VirtualMidiDevice(pattern="in")
+    out_device = VirtualMidiDevice(pattern="out")
+    router = BaseRouter(
+        in_device, [out_device], options=options, rules=rules, route="bench"
+    )
+    router.subscribe()
+
+    started = time.perf_counter()
+    for message in messages:
+        in_device.inject(message)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "throughput": len(messages) / elapsed,
+        **latency_summary("latency", f"bench/{out_device.label}"),
+    }
+
+
+@scenario
+def base_thru(options):
+    return route_messages(None, streams.mixed(options.messages))
+
+
+@scenario
+def base_rules(options):
+    rules = [
+        {"notes": [0, 59], "transpose": 12, "channel": 1},
+        {"types": ["control_change"], "channel": 2},
+    ]
+    return route_messages(rules, streams.mixed(options.messages))
+
+
+@scenario
+def base_split(options):
+    metrics.reset()
+    in_device = VirtualMidiDevice(pattern="in")
+    outputs = [VirtualMidiDevice(pattern=f"out{idx}") for idx in range(2)]
+    router = BaseRouter(in_device, outputs, rules=CONFIGS["split"], route="bench")
+    router.subscribe()
+
+    # note rules must not repeat clock and controllers on their outputs
+    in_device.inject(mido.Message("clock"))
+    in_device.inject(mido.Message("control_change", control=1, value=64))
+    if [out.sent for out in outputs] != [2, 2]:
+        raise AssertionError("Split rules send clock or cc more than once")
+
+    messages = streams.mixed(options.messages)
+    started = time.perf_counter()
+    for message in messages:
+        in_device.inject(message)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "throughput": len(messages) / elapsed,
+        "sends_per_message": (sum(out.sent for out in outputs) - 2) / len(messages),
+    }
+
+
+@scenario
+def base_clock(options):
+    return route_messages(None, streams.clock(options.messages))
+
+
+@scenario
+def base_clock_realtime(options):
+    return route_messages(
+        None, streams.clock(options.messages), options={"realtime": {}}
+    )
+
+
+def reference_bgr565(rgb565_frame):
+    """Colour swap as done before the in place encoder"""
+    import numpy
+
+    r_filter = int("1111100000000000", 2)
+    g_filter = int("0000011111100000", 2)
+    b_filter = int("0000000000011111", 2)
+    frame_r_shifted = numpy.right_shift(numpy.bitwise_and(rgb565_frame, r_filter), 11)
+    frame_g_shifted = numpy.bitwise_and(rgb565_frame, g_filter)
+    frame_b_shifted = numpy.left_shift(numpy.bitwise_and(rgb565_frame, b_filter), 11)
+    return frame_r_shifted + frame_g_shifted + frame_b_shifted
+
+
+def reference_prepare(buffer):
+    """Frame encoding as done before the in place encoder"""
+    import numpy
+
+    from midirouter.device.encoder import (
+        HEIGHT,
+        LINE_WIDTH,
+        NP_DISPLAY_FRAME_XOR_PATTERN,
+        WIDTH,
+    )
+
+    frame = numpy.ndarray(shape=(HEIGHT, WIDTH), dtype=numpy.uint16, buffer=buffer)
+    frame = frame.transpose()
+    prepared_frame = numpy.zeros(shape=(LINE_WIDTH, HEIGHT), dtype=numpy.uint16)
+    prepared_frame[0 : frame.shape[0], 0 : frame.shape[1]] = frame
+    prepared_frame = prepared_frame.transpose().flatten()
+    prepared_frame = reference_bgr565(prepared_frame)
+    prepared_frame = prepared_frame.byteswap()
+    prepared_frame = numpy.bitwise_xor(prepared_frame, NP_DISPLAY_FRAME_XOR_PATTERN)
+    return prepared_frame.byteswap().tobytes()
+
+
+@scenario
+def encode(options):
+    import numpy
+
+    from midirouter.device.encoder import HEIGHT, WIDTH, Push2FrameEncoder
+
+    encoder = Push2FrameEncoder()
+    random = numpy.random.default_rng(0)
+    buffer = random.integers(0, 1 << 16, HEIGHT * WIDTH, dtype=numpy.uint16).tobytes()
+    if bytes(encoder.encode(buffer)) != reference_prepare(buffer):
+        raise AssertionError("Encoded frame differs from the reference encoding")
+
+    frames = options.frames
+    started = time.perf_counter()
+    for _ in range(frames):
+        encoder.encode(buffer)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    encoder.encode(buffer)
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"encode_ms": elapsed / frames * 1000, "encode_alloc_bytes": allocated}
+
+
+def reference_chord(scale_notes, note_index, names):
+    """Chord and labels as built before chords were memoized"""
+    from midirouter.scales import HIGHEST_NOTE
+
+    chord_type = ""
+    chord_modifier_a = ""
+    chord_modifier_b = ""
+    names = set(names)
+
+    if not names:
+        chord = [scale_notes[note_index]]
+        return tuple(n for n in chord if n <= HIGHEST_NOTE), "", "", ""
+
+    # major chord
+    names.add("triad")
+    chord_type = "maj"
+    chord = [
+        scale_notes[note_index],
+        scale_notes[note_index + 2],
+        scale_notes[note_index + 4],
+    ]
+
+    # base major seventh chord
+    if "maj7" in names:
+        chord_type = "maj7"
+        chord = [
+            scale_notes[note_index],
+            scale_notes[note_index + 2],
+            scale_notes[note_index + 4],
+            scale_notes[note_index + 6],
+        ]
+
+    # sus4 precedence over sus2
+    if "sus2" in names and "sus4" in names:
+        names.remove("sus2")
+
+    # aug precedence over dim
+    if "aug" in names and "dim" in names:
+        names.remove("dim")
+
+    # sus2/4 precedence over min
+    if "min" in names and ("sus2" in names or "sus4" in names):
+        names.remove("min")
+
+    # dim/aug precedence over sus2/4
+    if ("dim" in names or "aug" in names) and ("sus2" in names or "sus4" in names):
+        if "sus2" in names:
+            names.remove("sus2")
+        if "sus4" in names:
+            names.remove("sus4")
+
+    if "min" in names:
+        chord_modifier_a = "min"
+    if "dim" in names:
+        chord_modifier_b = "dim"
+    if "aug" in names:
+        chord_modifier_b = "aug"
+    if "sus2" in names:
+        chord_modifier_b = "sus2"
+    if "sus4" in names:
+        chord_modifier_b = "sus4"
+
+    if "min" in names and "triad" in names:
+        chord[1] -= 1
+
+    if "min" in names and "maj7" in names:
+        chord[1] -= 1
+        chord[3] -= 1
+
+    if "sus2" in names:
+        chord[1] = scale_notes[note_index + 1]
+
+    if "sus4" in names:
+        chord[1] = scale_notes[note_index + 3]
+
+    if "dim" in names and "triad" in names:
+        chord[1] -= 1
+        chord[2] -= 1
+
+    if "dim" in names and "maj7" in names:
+        chord[1] -= 1
+        chord[2] -= 1
+        chord[3] -= 1
+
+    if "aug" in names and "triad" in names:
+        chord[2] += 1
+
+    if "aug" in names and "maj7" in names:
+        chord[2] += 1
+        chord[3] += 1
+
+    chord = tuple(n for n in chord if n <= HIGHEST_NOTE)
+    return chord, chord_type, chord_modifier_a, chord_modifier_b
+
+
+def check_chord_memo():
+    """Memoized chords must equal the reference for every pad and modifier"""
+    from midirouter.benchmarks.virtual import VirtualPush2Device
+    from midirouter.routers.push2.pages.chord import Push2ChordPage
+
+    page = Push2ChordPage(VirtualPush2Device(), on_midi_out=None)
+    page.initialize()
+    for scale in page.SCALES:
+        page.set_scale(scale)
+        for note_index in range(len(page._scale_notes) - 6):
+            for mask in range(1 << len(page.MODIFIER_BITS)):
+                names = [name for name, bit in page.MODIFIER_BITS.items() if mask & bit]
+                chord = page.lookup_chord(note_index, mask)
+                labels = (
+                    page._chord_type,
+                    page._chord_modifier_a,
+                    page._chord_modifier_b,
+                )
+                expected = reference_chord(page._scale_notes, note_index, names)
+                if (chord, *labels) != expected:
+                    raise AssertionError(
+                        f"Memoized chord differs for {page.SCALES[scale]} "
+                        f"note {note_index} modifiers {mask:#x}"
+                    )
+
+
+async def drive_push2(options):
+    from midirouter.benchmarks.virtual import VirtualPush2Device, VirtualPush2Display
+    from midirouter.routers.push2 import Push2Router
+
+    class BenchPush2Router(Push2Router):
+        DISPLAY_CLASS = VirtualPush2Display
+
+    check_chord_memo()
+
+    metrics.reset()
+    in_device = VirtualPush2Device(dispatch="loop")
+    out_device = VirtualMidiDevice(pattern="out", channel=15)
+    router = BenchPush2Router(
+        in_device, [out_device], options={"display": {"max_fps": 60}}, route="bench"
+    )
+    task = asyncio.create_task(router.run())
+    await asyncio.sleep(0.1)
+
+    # inject from another thread like the rtmidi callback does
+    messages = streams.chord_storm(options.messages)
+    interval = 1 / options.rate
+
+    def inject():
+        for message in messages:
+            in_device.inject(message)
+            time.sleep(interval)
+
+    display = router._display
+    frames = display.frames
+    leds = in_device.sent
+    started = time.perf_counter()
+    thread = threading.Thread(target=inject)
+    thread.start()
+    while thread.is_alive():
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    frames = display.frames - frames
+    leds = in_device.sent - leds
+
+    results = {
+        "throughput": len(messages) / elapsed,
+        "fps": frames / elapsed,
+        "led_messages": leds / len(messages),
+        **latency_summary("chord_latency", f"bench/{out_device.label}"),
+        **latency_summary("build", "bench/build"),
+        **latency_summary("prepare", "push2/prepare"),
+    }
+
+    # allocations of frames built right after a page change
+    page = router._display_page
+    tracemalloc.start()
+    allocated = 0
+    for message in messages[:200]:
+        page.on_message(message)
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        page.build()
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    task.cancel()
+    results["frame_alloc_bytes"] = allocated / 200
+    return results
+
+
+@scenario
+def push2_chords(options):
+    return asyncio.run(drive_push2(options))
+
+
+@scenario
+def startup(options):
+    """Cold start of a fresh interpreter up to the first routed message"""
+    results = {}
+    skipped = []
+    for router_name in ("base", "push2"):
+        started = time.perf_counter()
+        child = subprocess.run(
+            [sys.executable, "-m", "midirouter.benchmarks.startup", router_name],
+            cwd=SRC_DIR,
+            capture_output=True,
+            text=True,
+        )
+        elapsed = time.perf_counter() - started
+        if child.returncode:
+            # e.g. push2 dependencies missing, as encode and push2_chords skip
+            error = (child.stderr.strip().splitlines() or ["no output"])[-1]
+            skipped.append(f"{router_name} {error}")
+            continue
+
+        child = json.loads(child.stdout.splitlines()[-1])
+        results[f"{router_name}_import_ms"] = child["import_ms"]
+        results[f"{router_name}_first_message_ms"] = child["first_message_ms"]
+        results[f"{router_name}_process_ms"] = elapsed * 1000
+
+    if not results:
+        raise ImportError(", ".join(skipped))
+    for reason in skipped:
+        print(f"{'startup':<14} skipped {reason}")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against the baseline as printable lines"""
+    regressions = []
+    for name, values in baseline.items():
+        for metric, expected in values.items():
+            actual = results.get(name, {}).get(metric)
+            if actual is None or not expected:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                regressed = actual < expected * (1 - tolerance)
+            else:
+                regressed = actual > expected * (1 + tolerance)
+            if regressed:
+                regressions.append(f"{name}.{metric} {actual:.3f} vs {expected:.3f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hardware free benchmark suite")
+    parser.add_argument("scenarios", nargs="*", help=f"any of {list(SCENARIOS)}")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument(
+        "--rate", type=int, default=2000, help="Push 2 input messages per second"
+    )
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save_baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="Allowed relative regression"
+    )
+    options = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    results = {}
+    for name in options.scenarios or SCENARIOS:
+        try:
+            results[name] = SCENARIOS[name](options)
+        except ImportError as e:
+            print(f"{name:<14} skipped, {e}")
+            continue
+        for metric, value in results[name].items():
+            print(f"{name:<14} {metric:<22} {value:>14.3f}")
+
+    if options.save_baseline:
+        with open(options.baseline, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Baseline saved to {options.baseline}")
+        return
+
+    if not os.path.exists(options.baseline):
+        print("No baseline, run with --save_baseline on the target machine")
+        return
+
+    with open(options.baseline) as f:
+        regressions = compare(results, json.load(f), options.tolerance)
+
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if regressions:
+        sys.exit(1)
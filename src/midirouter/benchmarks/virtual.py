@@ -0,0 +1,81 @@
+from time import monotonic_ns
+
+import mido
+import mido.ports
+
+from midirouter.device.general import GeneralMidiDevice
+from midirouter.device.push2 import Push2Device
+
+
+class NullMidiOut:
+    """Stands in for rtmidi.MidiOut and counts sent messages"""
+
+    sent = 0
+
+    def send_message(self, data):
+        self.sent += 1
+
+
+class VirtualOutPort(mido.ports.BaseOutput):
+    """mido output port sending bytes to NullMidiOut like the rtmidi backend"""
+
+    def _open(self, **kwargs):
+        self._rt = NullMidiOut()
+
+    def _send(self, message):
+        self._rt.send_message(message.bytes())
+
+
+class VirtualMidiDevice(GeneralMidiDevice):
+    """In-process device with a virtual out port and injectable input"""
+
+    name = "virtual"
+
+    def __init__(self, pattern=None, channel=None, dispatch=None, queue=None):
+        super().__init__(
+            pattern=pattern, channel=channel, dispatch=dispatch, queue=queue
+        )
+        self._out_port = VirtualOutPort(name=self._pattern or self.name)
+        self._bind_out_port()
+
+    async def connect(self, ports=None):
+        self.on_ready()
+
+    def inject(self, message):
+        data = message.bytes()
+        if data[0] >= 0xF8:
+            self.on_realtime(data[0], monotonic_ns())
+        self.on_midi_in(message)
+
+    @property
+    def sent(self):
+        return self._out_port._rt.sent
+
+
+class VirtualPush2Device(VirtualMidiDevice, Push2Device):
+    """Push 2 controller whose pads and buttons are driven by inject"""
+
+    name = "virtual-push2"
+
+
+class VirtualPush2Display:
+    """In-memory sink with the Push2Display interface"""
+
+    def __init__(self, on_connected, on_disconnected):
+        self._on_connected = on_connected
+        self._on_disconnected = on_disconnected
+        # imported here, the transport pulls in usb
+        from midirouter.device.transport import DISPLAY_FRAME_SIZE
+
+        self.frame = bytearray(DISPLAY_FRAME_SIZE)
+        self.frames = 0
+
+    async def connect(self):
+        self._on_connected()
+
+    def show(self, frame):
+        memoryview(self.frame)[:] = memoryview(frame).cast("B")
+        self.frames += 1
+
+    def stats(self):
+        return {"sent": self.frames}
@@ -0,0 +1,70 @@
+import asyncio
+import collections
+import logging
+
+from midirouter import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class InputDispatcher:
+    """Hands incoming messages from the rtmidi callback thread to callbacks.
+
+    In inline mode callbacks run straight on the rtmidi thread for the lowest
+    thru latency. In loop mode messages are queued and a single consumer on the
+    asyncio loop delivers them in batches, so stateful pages are only touched
+    from the loop thread.
+    """
+
+    INLINE = "inline"
+    LOOP = "loop"
+
+    # queue depth logged as a warning once exceeded
+    HIGH_WATER = 256
+
+    _deliver = None
+    _loop = None
+    _queue = None
+    _scheduled = False
+
+    mode = INLINE
+
+    # queue depth found by the last drain and the largest one, loop mode only
+    _depth = None
+    _max_depth = None
+
+    def __init__(self, deliver, mode=None, name=None):
+        self._deliver = deliver
+        self.mode = mode or self.INLINE
+        if self.mode not in (self.INLINE, self.LOOP):
+            raise ValueError(f"Unknown dispatch mode {self.mode}")
+
+        if self.mode == self.LOOP:
+            self._loop = asyncio.get_event_loop()
+            self._queue = collections.deque()
+            self._depth = metrics.gauge(f"{name}/input_depth")
+            self._max_depth = metrics.gauge(f"{name}/input_max_depth")
+            self.put = self._put_queued
+        else:
+            self.put = deliver
+
+    def _put_queued(self, message, received_ns):
+        """Called on the rtmidi thread, wakes the consumer once per batch"""
+        self._queue.append((message, received_ns))
+        if not self._scheduled:
+            self._scheduled = True
+            self._loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self):
+        # reset before popping so a message queued meanwhile schedules a new drain
+        self._scheduled = False
+        depth = len(self._queue)
+        self._depth.set(depth)
+        if depth > self._max_depth.value:
+            if self._max_depth.value <= self.HIGH_WATER < depth:
+                logger.warning(f"Input queue depth {depth} over {self.HIGH_WATER}")
+            self._max_depth.set(depth)
+
+        queue = self._queue
+        while queue:
+            self._deliver(*queue.popleft())
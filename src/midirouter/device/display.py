@@ -3,9 +3,10 @@ import logging
 
 import usb.core
 
+from midirouter.device.transport import Push2FrameTransport
+
 ABLETON_VENDOR_ID = 0x2982
 PUSH2_PRODUCT_ID = 0x1967
-USB_TRANSFER_TIMEOUT = 1000
 
 DISPLAY_FRAME_HEADER = [
     0xFF,
@@ -32,6 +33,8 @@ logger = logging.getLogger(__name__)
 class Push2Display:
 
     _usb_endpoint = None
+    _transport = None
+    _loop = None
     _connected = False
     _on_connected = None
     _on_disconnected = None
@@ -62,13 +65,33 @@ class Push2Display:
             await asyncio.sleep(5)
 
         self._usb_endpoint = descriptor
+        self._loop = asyncio.get_running_loop()
+        self._transport = Push2FrameTransport(
+            self._usb_endpoint,
+            DISPLAY_FRAME_HEADER,
+            on_error=self.on_transfer_error,
+        )
+        self._transport.start()
+        self._connected = True
         if self._on_connected:
             self._on_connected()
 
+    def on_transfer_error(self):
+        """Called from the transport thread when a usb transfer fails"""
+        self._loop.call_soon_threadsafe(self.disconnect)
+
+    def disconnect(self):
+        if not self._connected:
+            return
+        self._connected = False
+        self._transport.stop()
+        if self._on_disconnected:
+            self._on_disconnected()
+
     def show(self, frame):
-        try:
-            self._usb_endpoint.write(DISPLAY_FRAME_HEADER, USB_TRANSFER_TIMEOUT)
-            self._usb_endpoint.write(frame, USB_TRANSFER_TIMEOUT)
-        except usb.core.USBError:
-            if self._on_disconnected:
-                self._on_disconnected()
+        """Hand the frame over to the usb writer thread without blocking"""
+        if self._connected:
+            self._transport.submit(frame)
+
+    def stats(self):
+        return self._transport.stats() if self._transport else {}
@@ -0,0 +1,52 @@
+import numpy
+
+HEIGHT = 160
+WIDTH = 960
+DISPLAY_LINE_FILLER_BYTES = 128
+LINE_WIDTH = WIDTH + DISPLAY_LINE_FILLER_BYTES // 2
+NP_DISPLAY_FRAME_XOR_PATTERN = numpy.tile(
+    numpy.array([0xE7F3, 0xE7FF], dtype=numpy.uint16), LINE_WIDTH * HEIGHT // 2
+)
+
+
+class Push2FrameEncoder:
+    """Encodes rgb565 frames into the push 2 display format.
+
+    Every pass runs in place on preallocated buffers, the returned memoryview
+    is overwritten by the next call.
+    """
+
+    def __init__(self):
+        shape = (HEIGHT, LINE_WIDTH)
+
+        # frame in the display line layout, pages may render into it directly,
+        # filler pixels stay black
+        self.lines = numpy.zeros(shape, dtype=numpy.uint16)
+        self._scratch = numpy.empty(shape, dtype=numpy.uint16)
+        self._frame = numpy.empty(shape, dtype=numpy.uint16)
+
+        # the frame is xor-ed in native byte order instead of swapping it twice
+        self._pattern = NP_DISPLAY_FRAME_XOR_PATTERN.byteswap().reshape(shape)
+        self._view = memoryview(self._frame).cast("B")
+
+    def encode(self, buffer):
+        """Encode a frame of packed 960 pixel lines"""
+        source = numpy.ndarray(shape=(HEIGHT, WIDTH), dtype=numpy.uint16, buffer=buffer)
+        numpy.copyto(self.lines[:, :WIDTH], source)
+        return self.encode_lines()
+
+    def encode_lines(self):
+        """Encode the frame rendered into the line buffer"""
+        source = self.lines
+        frame = self._frame
+        scratch = self._scratch
+
+        # rgb565 to bgr565, green stays in place
+        numpy.right_shift(source, 11, out=frame)
+        numpy.bitwise_and(source, 0x07E0, out=scratch)
+        numpy.bitwise_or(frame, scratch, out=frame)
+        numpy.left_shift(source, 11, out=scratch)
+        numpy.bitwise_or(frame, scratch, out=frame)
+
+        numpy.bitwise_xor(frame, self._pattern, out=frame)
+        return self._view
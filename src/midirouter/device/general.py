@@ -1,9 +1,11 @@
 import logging
-import time
+from time import monotonic_ns
 
 import mido
 
-from midirouter.utils import get_in_ports, get_out_ports
+from midirouter.device.dispatch import InputDispatcher
+from midirouter.device.notes import HeldNotes, is_note
+from midirouter.device.queue import SendQueue
 
 logger = logging.getLogger(__name__)
 
@@ -24,64 +26,173 @@ class GeneralMidiDevice:
     # Midi out port
     _out_port = None
 
+    # Sends a sequence of midi bytes to the out port
+    _send_raw = None
+
     _callbacks = None
 
+    # Callbacks taking (status, received_ns) of realtime messages, these run
+    # on the midi thread ahead of message parsing and dispatch
+    _realtime_callbacks = None
+
+    # Default input dispatch mode, see InputDispatcher
+    DISPATCH = InputDispatcher.INLINE
+
+    _dispatcher = None
+
     # Midi out channel to send messages to
     channel = None
 
-    def __init__(self, pattern=None, channel=None):
+    # Size of the out queue with its own sender thread, sends inline if not set
+    queue_size = None
+
+    _queue = None
+
+    # Pool names of the subscribed in port and acquired out port
+    _in_name = None
+    _out_name = None
+
+    # Notes sent and not yet released, sent note offs on disconnect
+    held_notes = None
+
+    # Monotonic ns the message being dispatched was received at
+    received_ns = 0
+
+    def __init__(self, pattern=None, channel=None, dispatch=None, queue=None):
         self._pattern = pattern
+        self.queue_size = queue
         self._callbacks = []
+        self._realtime_callbacks = []
+        self.held_notes = HeldNotes()
         self.channel = channel
-        self.connect()
-        self.on_ready()
+        self._dispatcher = InputDispatcher(
+            self.dispatch_midi_in, mode=dispatch or self.DISPATCH, name=self.label
+        )
 
-    def connect(self):
+    async def connect(self, ports):
+        """Subscribe to in and out ports once they show up in the port pool"""
         pattern = self._pattern or self.PATTERN
-        if not pattern:
-            return
-
-        while True:
-            port_name = self._find_port(get_in_ports(), pattern)
-            if port_name:
-                break
-            logger.warning("In port not found, waiting...")
-            time.sleep(5)
+        if pattern:
+            in_name, out_name = await ports.resolve(pattern)
+            self._in_port = ports.subscribe(
+                in_name, self.on_midi_in, pattern, realtime=self.on_realtime
+            )
+            self._in_name = in_name
+            self._out_port = ports.acquire_output(out_name, pattern)
+            self._out_name = out_name
+            self._out_port.add_listener(self.on_reconnected)
+            self._bind_out_port()
 
-        self._in_port = mido.open_input(port_name)
-        self._in_port.callback = self.on_midi_in
-        logger.info(f"Opened IN port {port_name}")
+        self.on_ready()
 
-        while True:
-            port_name = self._find_port(get_out_ports(), pattern)
-            if port_name:
-                break
-            logger.warning("Out port not found, waiting...")
-            time.sleep(5)
+    def disconnect(self, ports):
+        """Release held notes and hand the shared ports back to the pool.
+
+        Ports stay open while devices of other routes still use them.
+        """
+        self._callbacks.clear()
+        self._realtime_callbacks.clear()
+        if self._send_raw is not None:
+            released = self.held_notes.release(self._send_raw)
+            if released:
+                logger.info(f"Released {released} held notes on {self.label}")
+        if self._queue is not None:
+            self._queue.close()
+
+        if self._in_name is not None:
+            ports.unsubscribe(self._in_name, self.on_midi_in, self.on_realtime)
+            self._in_name = None
+        if self._out_name is not None:
+            self._out_port.remove_listener(self.on_reconnected)
+            ports.release_output(self._out_name)
+            self._out_name = None
+
+    def _bind_out_port(self):
+        # shared out ports serialise writers from several routes, rtmidi
+        # ports take raw bytes skipping mido validation and copies
+        send_raw = getattr(self._out_port, "send_raw", None)
+        rt = getattr(self._out_port, "_rt", None)
+        if send_raw is not None:
+            self._send_raw = send_raw
+        elif rt is not None:
+            self._send_raw = rt.send_message
+        else:
+            self._send_raw = self._send_raw_message
+        self._bind_queue()
+
+    def _bind_queue(self):
+        if not self.queue_size:
+            return
+        if self._queue is None:
+            self._queue = SendQueue(self._send_raw, self.queue_size, self.label)
+        self._send_raw = self._queue.put
 
-        self._out_port = mido.open_output(port_name)
-        logger.info(f"Opened OUT port {port_name}")
+    def _send_raw_message(self, data):
+        self._out_port.send(mido.Message.from_bytes(data))
 
     def on_ready(self):
         pass
 
+    def on_reconnected(self):
+        """Called after a lost out port has been opened again"""
+        pass
+
     def send(self, message):
         self._out_port.send(message)
 
+    def send_bytes(self, data):
+        """Send a single encoded midi message"""
+        if is_note(data):
+            self.held_notes.track(data)
+        self._send_raw(data)
+
+    def send_batch(self, messages):
+        """Send a batch of encoded midi messages"""
+        send = self._send_raw
+        for data in messages:
+            send(data)
+
+    def send_notes(self, status, notes, velocity):
+        """Send the same note message for several notes without allocations.
+
+        Raw bytes skip mido validation, notes outside 0-127 are dropped
+        instead of going out as status bytes.
+        """
+        self.held_notes.track_notes(status, notes, velocity)
+        send = self._send_raw
+        data = [status, 0, velocity]
+        for note in notes:
+            if note & ~0x7F:
+                logger.warning(f"Dropped note {note} out of range on {self.label}")
+                continue
+            data[1] = note
+            send(data)
+
     def add_callback(self, callback):
         self._callbacks.append(callback)
 
+    def add_drain_callback(self, callback):
+        """Call back whenever the out queue runs empty, False without a queue"""
+        if self._queue is None:
+            return False
+        self._queue.add_drain_callback(callback)
+        return True
+
+    def add_realtime_callback(self, callback):
+        self._realtime_callbacks.append(callback)
+
+    @property
+    def label(self):
+        return f"{self.name}:{self._pattern or self.PATTERN}"
+
+    def on_realtime(self, status, received_ns):
+        for callback in self._realtime_callbacks:
+            callback(status, received_ns)
+
     def on_midi_in(self, message):
+        self._dispatcher.put(message, monotonic_ns())
+
+    def dispatch_midi_in(self, message, received_ns):
+        self.received_ns = received_ns
         for callback in self._callbacks:
             callback(message)
-
-    @staticmethod
-    def _find_port(names, pattern=None):
-        logger.info("Looking for %s in %s", pattern, names)
-        if not names or not pattern:
-            logger.warning("No midi devices or pattern empty")
-            return None
-
-        for name in names:
-            if pattern in name:
-                return name
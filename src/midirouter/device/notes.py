@@ -0,0 +1,46 @@
+from midirouter.midi import NOTE_OFF
+
+# Notes per channel, the held flag of a note is at channel << 7 | note
+NOTES = 128
+
+
+def is_note(data):
+    """True for note on and note off messages"""
+    return data[0] & 0xE0 == 0x80
+
+
+class HeldNotes:
+    """Notes sounding on one output, released with note offs on shutdown.
+
+    Only a flag per channel and note is kept, so tracking a message is a
+    single store and release sends at most one note off per note.
+    """
+
+    def __init__(self):
+        self._held = bytearray(16 * NOTES)
+
+    def __len__(self):
+        return self._held.count(1)
+
+    def track(self, data):
+        status = data[0]
+        self._held[(status & 0x0F) << 7 | data[1]] = status >= 0x90 and data[2] > 0
+
+    def track_notes(self, status, notes, velocity):
+        held = self._held
+        index = (status & 0x0F) << 7
+        on = status & 0xF0 == 0x90 and velocity > 0
+        for note in notes:
+            # out of range notes are not sent, nor may they mark other channels
+            if not note & ~0x7F:
+                held[index | note] = on
+
+    def release(self, send):
+        """Send a note off for every held note, returns the number released"""
+        released = 0
+        for index, on in enumerate(self._held):
+            if on:
+                send([NOTE_OFF[index >> 7], index & 0x7F, 0])
+                released += 1
+        self._held[:] = bytes(len(self._held))
+        return released
@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import threading
+from collections import deque
+from time import monotonic_ns
+
+import mido
+
+from midirouter import metrics
+from midirouter.utils import get_in_ports, get_out_ports
+
+logger = logging.getLogger(__name__)
+
+
+def find_port(names, pattern):
+    for name in names:
+        if pattern in name:
+            return name
+    return None
+
+
+def _list_ports():
+    return get_in_ports(), get_out_ports()
+
+
+class PortIndex:
+    """Port names shared by all devices waiting for their ports.
+
+    Ports are enumerated once per poll tick however many devices are still
+    missing, enumeration runs in an executor to keep the loop responsive.
+    """
+
+    POLL_INTERVAL = 5
+
+    in_ports = ()
+    out_ports = ()
+
+    _tick = None
+
+    def __init__(self, poll_interval=None):
+        self.poll_interval = poll_interval or self.POLL_INTERVAL
+
+    async def refresh(self):
+        loop = asyncio.get_running_loop()
+        self.in_ports, self.out_ports = await loop.run_in_executor(None, _list_ports)
+        logger.debug(f"Midi ports in {self.in_ports} out {self.out_ports}")
+
+    async def next_tick(self):
+        """Wait for the next enumeration, shared by all waiting devices"""
+        if self._tick is None:
+            self._tick = asyncio.create_task(self._poll())
+        await asyncio.shield(self._tick)
+
+    async def _poll(self):
+        try:
+            await asyncio.sleep(self.poll_interval)
+            await self.refresh()
+        finally:
+            self._tick = None
+
+    async def resolve(self, pattern):
+        """In and out port names matching the pattern, waits until both exist"""
+        while True:
+            in_name = find_port(self.in_ports, pattern)
+            out_name = find_port(self.out_ports, pattern)
+            if in_name and out_name:
+                return in_name, out_name
+            logger.warning(f"Ports matching {pattern} not found, waiting...")
+            await self.next_tick()
+
+
+class SharedPort:
+    """Port opened once for all devices, reopened when it comes back"""
+
+    # Port direction used in logs
+    KIND = None
+
+    port = None
+
+    connected = False
+
+    # Monotonic ns the port was lost at
+    disconnected_ns = 0
+
+    def __init__(self, name, pattern=None):
+        self.name = name
+        self.pattern = pattern or name
+        metric = f"reconnect/{self.pattern}/{self.KIND.lower()}"
+        self._reconnect_latency = metrics.histogram(metric)
+        self._disconnects = metrics.counter(f"{metric}/disconnects")
+        self.open(name)
+
+    def open(self, name):
+        self.name = name
+        self.port = self._open(name)
+        self.connected = True
+        logger.info(f"Opened {self.KIND} port {name}")
+
+    def _open(self, name):
+        raise NotImplementedError
+
+    def disconnect(self):
+        if not self.connected:
+            return
+        self.connected = False
+        self.disconnected_ns = monotonic_ns()
+        self._disconnects.add()
+        logger.warning(f"Lost {self.KIND} port {self.name}")
+        self.close()
+
+    def reconnect(self, name):
+        self.open(name)
+        elapsed = monotonic_ns() - self.disconnected_ns
+        self._reconnect_latency.record(elapsed)
+        logger.info(f"Reconnected {self.KIND} port {name} in {elapsed / 1e6:.0f}ms")
+
+    def close(self):
+        # late senders must not reach a closed port
+        self.connected = False
+        try:
+            self.port.close()
+        except Exception:
+            logger.exception(f"Failed to close {self.KIND} port {self.name}")
+
+
+class SharedInput(SharedPort):
+    """Midi in port fanning incoming messages out to several subscribers"""
+
+    KIND = "IN"
+
+    def __init__(self, name, pattern=None):
+        self.subscribers = []
+        self.realtime = []
+        super().__init__(name, pattern)
+
+    def _open(self, name):
+        port = mido.open_input(name)
+        port.callback = self.on_message
+        # see realtime messages in the raw rtmidi callback before mido parses
+        rt = getattr(port, "_rt", None)
+        if rt is not None:
+            rt.cancel_callback()
+            rt.set_callback(self.on_raw_message, port._callback_wrapper)
+        return port
+
+    def on_raw_message(self, event, parse):
+        status = event[0][0]
+        if status >= 0xF8:
+            received_ns = monotonic_ns()
+            for callback in self.realtime:
+                callback(status, received_ns)
+        parse(event, None)
+
+    def on_message(self, message):
+        for callback in self.subscribers:
+            callback(message)
+
+
+class SharedOutput(SharedPort):
+    """Midi out port shared by several devices behind a single writer lock.
+
+    Messages sent while the port is gone are kept in a short buffer, oldest
+    dropped first, and flushed on reconnect unless they got too old.
+    """
+
+    KIND = "OUT"
+
+    BUFFER_SIZE = 64
+
+    # Buffered messages older than this are dropped on reconnect
+    BUFFER_MAX_AGE = 1.0
+
+    def __init__(self, name, pattern=None):
+        self.refs = 0
+        # reentrant, a failing send disconnects while holding it
+        self._lock = threading.RLock()
+        self._buffer = deque(maxlen=self.BUFFER_SIZE)
+        self._listeners = []
+        self._dropped = metrics.counter(f"reconnect/{pattern or name}/out/dropped")
+        super().__init__(name, pattern)
+
+    def _open(self, name):
+        port = mido.open_output(name)
+        # rtmidi ports take raw bytes, skipping mido validation and copies
+        rt = getattr(port, "_rt", None)
+        self._send_message = rt.send_message if rt is not None else self._send_mido
+        return port
+
+    def _send_mido(self, data):
+        self.port.send(mido.Message.from_bytes(data))
+
+    def add_listener(self, callback):
+        """Call back after the port has been reconnected"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        self._listeners.remove(callback)
+
+    def send(self, message):
+        self.send_raw(message.bytes())
+
+    def send_raw(self, data):
+        with self._lock:
+            if self.connected:
+                try:
+                    self._send_message(data)
+                    return
+                except Exception:
+                    logger.exception(f"Failed to send to OUT port {self.name}")
+                    self.disconnect()
+            self._hold(data)
+
+    def _hold(self, data):
+        if len(self._buffer) == self.BUFFER_SIZE:
+            self._dropped.add()
+        # senders may reuse their buffers
+        self._buffer.append(bytes(data))
+
+    def close(self):
+        # wait for a send in progress on another thread
+        with self._lock:
+            super().close()
+
+    def reconnect(self, name):
+        with self._lock:
+            super().reconnect(name)
+            buffered = len(self._buffer)
+            if monotonic_ns() - self.disconnected_ns > self.BUFFER_MAX_AGE * 1e9:
+                self._dropped.add(buffered)
+            else:
+                for data in self._buffer:
+                    self._send_message(data)
+            self._buffer.clear()
+
+        for callback in self._listeners:
+            callback()
+
+
+class PortPool:
+    """Opens every resolved port once however many devices use it.
+
+    monitor watches the opened ports and reopens the lost ones with bounded
+    backoff, devices keep their shared ports so only routes using a lost
+    port pause.
+    """
+
+    HEALTH_INTERVAL = 1.0
+
+    BACKOFF_MAX = 8.0
+
+    def __init__(self, index):
+        self.index = index
+        self._inputs = {}
+        self._outputs = {}
+
+    async def resolve(self, pattern):
+        return await self.index.resolve(pattern)
+
+    def subscribe(self, name, callback, pattern=None, realtime=None):
+        port = self._inputs.get(name)
+        if port is None:
+            port = self._inputs[name] = SharedInput(name, pattern)
+        port.subscribers.append(callback)
+        if realtime is not None:
+            port.realtime.append(realtime)
+        return port
+
+    def unsubscribe(self, name, callback, realtime=None):
+        port = self._inputs.get(name)
+        if port is None:
+            return
+        port.subscribers.remove(callback)
+        if realtime is not None:
+            port.realtime.remove(realtime)
+        if not port.subscribers:
+            del self._inputs[name]
+            port.close()
+
+    def acquire_output(self, name, pattern=None):
+        port = self._outputs.get(name)
+        if port is None:
+            port = self._outputs[name] = SharedOutput(name, pattern)
+        port.refs += 1
+        return port
+
+    def release_output(self, name):
+        port = self._outputs.get(name)
+        if port is None:
+            return
+        port.refs -= 1
+        if not port.refs:
+            del self._outputs[name]
+            port.close()
+
+    async def monitor(self):
+        """Detect lost ports and reconnect them in the background"""
+        delay = self.HEALTH_INTERVAL
+        while True:
+            await asyncio.sleep(delay)
+            await self.index.refresh()
+            if self.check():
+                delay = self.HEALTH_INTERVAL
+            else:
+                delay = min(delay * 2, self.BACKOFF_MAX)
+
+    def check(self):
+        """Disconnect vanished ports and reopen returned ones, True if healthy"""
+        healthy = True
+        for ports, names in (
+            (self._inputs, self.index.in_ports),
+            (self._outputs, self.index.out_ports),
+        ):
+            for port in ports.values():
+                if port.connected and port.name not in names:
+                    port.disconnect()
+                if port.connected:
+                    continue
+                # the system may give a replugged device a different name
+                name = find_port(names, port.pattern)
+                if name is None:
+                    healthy = False
+                    continue
+                try:
+                    port.reconnect(name)
+                except Exception:
+                    logger.exception(f"Failed to reconnect {port.KIND} port {name}")
+                    healthy = False
+        return healthy
@@ -1,6 +1,8 @@
-import mido
+import asyncio
 
+from midirouter.device.dispatch import InputDispatcher
 from midirouter.device.general import GeneralMidiDevice
+from midirouter.midi import CONTROL_CHANGE, NOTE_ON
 
 
 class MidiEvents:
@@ -27,13 +29,93 @@ class Push2Device(GeneralMidiDevice):
     name = "push2"
     PATTERN = "Push 2 Live Port"
 
+    # pages keep state shared with the display loop
+    DISPATCH = InputDispatcher.LOOP
+
+    # Status bytes lighting pads and buttons
+    PAD = NOTE_ON[0]
+    CONTROL = CONTROL_CHANGE[0]
+
+    # Shadow state of leds never set
+    UNKNOWN = 0xFF
+
+    # Colors requested by pages and colors sent to the controller, by status
+    _leds = None
+    _shown = None
+
+    # (status, index) of leds changed since the last flush
+    _dirty = None
+
+    _flush_scheduled = False
+
+    def __init__(self, pattern=None, channel=None, dispatch=None, queue=None):
+        super().__init__(
+            pattern=pattern, channel=channel, dispatch=dispatch, queue=queue
+        )
+        unknown = bytes([self.UNKNOWN]) * 128
+        self._leds = {self.PAD: bytearray(unknown), self.CONTROL: bytearray(unknown)}
+        self._shown = {self.PAD: bytearray(unknown), self.CONTROL: bytearray(unknown)}
+        self._dirty = []
+
     def on_ready(self):
         pass
 
+    def on_reconnected(self):
+        """The controller comes back dark, repaint every led"""
+        for status, shown in self._shown.items():
+            shown[:] = bytes([self.UNKNOWN]) * 128
+            for index, color in enumerate(self._leds[status]):
+                if color != self.UNKNOWN:
+                    self._dirty.append((status, index))
+        self._schedule_flush()
+
     def highlight_pad(self, note, color=Push2Colors.WHITE):
-        self._out_port.send(mido.Message(MidiEvents.NOTE_ON, note=note, velocity=color))
+        self._set_led(self.PAD, note, color)
 
     def highlight_control(self, cc, color=Push2Colors.DARK_GRAY):
-        self._out_port.send(
-            mido.Message(MidiEvents.CONTROL_CHANGE, control=cc, value=color)
-        )
+        self._set_led(self.CONTROL, cc, color)
+
+    def paint_layout(self, pads=None, controls=None):
+        """Set many leds at once from {note: color} and {cc: color} mappings"""
+        for status, colors in ((self.PAD, pads), (self.CONTROL, controls)):
+            leds = self._leds[status]
+            for index, color in (colors or {}).items():
+                if leds[index] != color:
+                    leds[index] = color
+                    self._dirty.append((status, index))
+        self._schedule_flush()
+
+    def _set_led(self, status, index, color):
+        leds = self._leds[status]
+        if leds[index] == color:
+            return
+        leds[index] = color
+        self._dirty.append((status, index))
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_scheduled or not self._dirty:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._flush_scheduled = True
+        loop.call_soon(self.flush)
+
+    def flush(self):
+        """Send leds changed since the last flush in a single batch"""
+        self._flush_scheduled = False
+        if self._send_raw is None:
+            return
+        messages = []
+        for status, index in self._dirty:
+            color = self._leds[status][index]
+            shown = self._shown[status]
+            if shown[index] != color:
+                shown[index] = color
+                messages.append((status, index, color))
+        self._dirty.clear()
+        if messages:
+            self.send_batch(messages)
@@ -0,0 +1,109 @@
+import collections
+import logging
+import threading
+from time import monotonic_ns
+
+from midirouter import metrics
+
+logger = logging.getLogger(__name__)
+
+# Status high nibbles of messages dropped first when a queue overflows
+DROPPABLE = (0xA0, 0xB0, 0xD0, 0xE0)
+
+
+def is_note_off(data):
+    kind = data[0] & 0xF0
+    return kind == 0x80 or (kind == 0x90 and data[2] == 0)
+
+
+class SendQueue:
+    """Bounded queue with its own sender thread in front of one output.
+
+    A slow or blocking port only delays its own messages. When the queue is
+    full the oldest controller message is dropped, or the new message when
+    there is none, note offs are always queued so no note hangs.
+    """
+
+    _running = False
+
+    # Seconds close waits for the queued messages to go out
+    CLOSE_TIMEOUT = 1.0
+
+    def __init__(self, send, size, name):
+        self._send = send
+        self.size = size
+        self.name = name
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._drain_callbacks = []
+        self._dropped = metrics.counter(f"{name}/queue_dropped")
+        self._depth = metrics.gauge(f"{name}/queue_max_depth")
+        self._wait = metrics.histogram(f"{name}/queue_wait")
+        self._thread = threading.Thread(
+            target=self._run, name=f"send {name}", daemon=True
+        )
+        self._running = True
+        self._thread.start()
+
+    @property
+    def depth(self):
+        return len(self._queue)
+
+    def add_drain_callback(self, callback):
+        """Call back on the sender thread whenever the queue runs empty"""
+        self._drain_callbacks.append(callback)
+
+    def put(self, data):
+        # senders may reuse their buffers
+        item = (bytes(data), monotonic_ns())
+        queue = self._queue
+        with self._lock:
+            if len(queue) >= self.size and not is_note_off(data):
+                if not self._drop_oldest():
+                    self._dropped.add()
+                    return
+            queue.append(item)
+            if len(queue) > self._depth.value:
+                self._depth.set(len(queue))
+        self._ready.set()
+
+    def _drop_oldest(self):
+        for index, (data, queued_ns) in enumerate(self._queue):
+            if data[0] & 0xF0 in DROPPABLE:
+                del self._queue[index]
+                self._dropped.add()
+                return True
+        return False
+
+    def close(self):
+        """Stop the sender thread once the queued messages are sent"""
+        self._running = False
+        self._ready.set()
+        self._thread.join(self.CLOSE_TIMEOUT)
+        if self._thread.is_alive():
+            logger.warning(f"{self.name} closed with {self.depth} messages unsent")
+
+    def _run(self):
+        queue = self._queue
+        while True:
+            with self._lock:
+                item = queue.popleft() if queue else None
+                if item is None:
+                    self._ready.clear()
+
+            if item is None:
+                if not self._running:
+                    break
+                for callback in self._drain_callbacks:
+                    callback()
+                if not queue:
+                    self._ready.wait()
+                continue
+
+            data, queued_ns = item
+            self._wait.record(monotonic_ns() - queued_ns)
+            try:
+                self._send(data)
+            except Exception:
+                logger.exception(f"Failed to send to {self.name}")
@@ -0,0 +1,93 @@
+import logging
+import threading
+from time import monotonic_ns
+
+import mido
+
+from midirouter.device.general import GeneralMidiDevice
+from midirouter.device.push2 import Push2Device
+from midirouter.ring import MessageRing
+
+logger = logging.getLogger(__name__)
+
+
+def start_consumer(ring, callback, name):
+    thread = threading.Thread(
+        target=ring.consume, args=(callback,), name=name, daemon=True
+    )
+    thread.start()
+    return thread
+
+
+class DeviceLink:
+    """Rings connecting a worker to a device owned by another worker.
+
+    The in ring carries messages the owner receives from the device, the
+    out ring messages to send to it. Several devices of the worker may share
+    the link, so it fans in messages out and serialises writers.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.in_ring = MessageRing()
+        self.out_ring = MessageRing()
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+        if len(self._subscribers) == 1:
+            self.in_ring.skip()
+            start_consumer(self.in_ring, self._deliver, f"ring in {self.key}")
+
+    def _deliver(self, data):
+        for callback in self._subscribers:
+            callback(data)
+
+    def send(self, message):
+        self.send_raw(message.bytes())
+
+    def send_raw(self, data):
+        with self._lock:
+            self.out_ring.put(data)
+
+
+class RemoteMidiDevice(GeneralMidiDevice):
+    """Device opened by another worker process, reached through a DeviceLink"""
+
+    name = "remote"
+
+    _link = None
+
+    def __init__(
+        self, pattern=None, channel=None, dispatch=None, queue=None, link=None
+    ):
+        super().__init__(
+            pattern=pattern, channel=channel, dispatch=dispatch, queue=queue
+        )
+        self._link = link
+
+    async def connect(self, ports=None):
+        self._out_port = self._link
+        self._bind_out_port()
+        self._link.subscribe(self.on_remote_message)
+        self.on_ready()
+
+    def on_remote_message(self, data):
+        if data[0] >= 0xF8:
+            self.on_realtime(data[0], monotonic_ns())
+        self.on_midi_in(mido.Message.from_bytes(data))
+
+
+class RemotePush2Device(RemoteMidiDevice, Push2Device):
+    pass
+
+
+def serve_remote(device, links):
+    """Relay a device owned by this worker to the workers linked to it"""
+    for link in links:
+        put = link.in_ring.put
+        device.add_callback(lambda message, put=put: put(message.bytes()))
+        link.out_ring.skip()
+        start_consumer(link.out_ring, device.send_bytes, f"ring out {link.key}")
+    logger.info(f"Serving {device.label} to {len(links)} workers")
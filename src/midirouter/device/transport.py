@@ -0,0 +1,152 @@
+import array
+import logging
+import threading
+import time
+
+import usb.core
+
+from midirouter import metrics
+
+logger = logging.getLogger(__name__)
+
+USB_TRANSFER_TIMEOUT = 1000
+
+# Push 2 display frame is 160 lines of 1024 16bit pixels
+DISPLAY_FRAME_SIZE = 160 * 1024 * 2
+
+# Frame is split into bulk transfers of this size
+DISPLAY_CHUNK_SIZE = 16 * 1024
+
+# Seconds between stats log lines
+STATS_INTERVAL = 60
+
+
+class FrameBuffer:
+    """Preallocated frame split into transfer sized chunks"""
+
+    def __init__(self, size, chunk_size):
+        self.chunks = [
+            array.array("B", bytes(min(chunk_size, size - offset)))
+            for offset in range(0, size, chunk_size)
+        ]
+
+    def fill(self, frame):
+        frame = memoryview(frame).cast("B")
+        offset = 0
+        for chunk in self.chunks:
+            size = len(chunk)
+            memoryview(chunk)[:] = frame[offset : offset + size]
+            offset += size
+
+
+class Push2FrameTransport:
+    """Sends display frames on a dedicated USB writer thread.
+
+    Frames are double buffered: the writer thread sends the front buffer while
+    the producer fills the back buffer. A frame that is not picked up before the
+    next one arrives is superseded and counted as dropped.
+    """
+
+    _endpoint = None
+    _header = None
+    _on_error = None
+
+    _thread = None
+    _condition = None
+    _running = False
+
+    _front = None
+    _back = None
+    _pending = False
+
+    frames_submitted = 0
+    frames_sent = 0
+    frames_dropped = 0
+    transfer_errors = 0
+    last_transfer_time = 0.0
+    total_transfer_time = 0.0
+
+    def __init__(
+        self,
+        endpoint,
+        header,
+        on_error=None,
+        frame_size=DISPLAY_FRAME_SIZE,
+        chunk_size=DISPLAY_CHUNK_SIZE,
+    ):
+        self._endpoint = endpoint
+        self._header = array.array("B", header)
+        self._on_error = on_error
+        self._condition = threading.Condition()
+        self._latency = metrics.histogram("push2/usb")
+        self._front = FrameBuffer(frame_size, chunk_size)
+        self._back = FrameBuffer(frame_size, chunk_size)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="push2-display", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Signal the writer thread to exit once the current frame is sent"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        logger.info(f"Display transport stopped {self.stats()}")
+
+    def submit(self, frame):
+        """Queue a frame for sending, replacing a frame still waiting"""
+        with self._condition:
+            if self._pending:
+                self.frames_dropped += 1
+            self._back.fill(frame)
+            self._pending = True
+            self.frames_submitted += 1
+            self._condition.notify()
+
+    def stats(self):
+        return {
+            "submitted": self.frames_submitted,
+            "sent": self.frames_sent,
+            "dropped": self.frames_dropped,
+            "errors": self.transfer_errors,
+            "last_transfer_ms": round(self.last_transfer_time * 1000, 3),
+            "avg_transfer_ms": round(
+                self.total_transfer_time * 1000 / (self.frames_sent or 1), 3
+            ),
+        }
+
+    def _run(self):
+        stats_logged = time.monotonic()
+        while True:
+            with self._condition:
+                while self._running and not self._pending:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                self._front, self._back = self._back, self._front
+                self._pending = False
+
+            started = time.perf_counter()
+            try:
+                self._endpoint.write(self._header, USB_TRANSFER_TIMEOUT)
+                for chunk in self._front.chunks:
+                    self._endpoint.write(chunk, USB_TRANSFER_TIMEOUT)
+            except usb.core.USBError as e:
+                self.transfer_errors += 1
+                logger.warning(f"Display transfer failed: {e}")
+                if self._on_error:
+                    self._on_error()
+                continue
+
+            self.last_transfer_time = time.perf_counter() - started
+            self._latency.record(int(self.last_transfer_time * 1e9))
+            self.total_transfer_time += self.last_transfer_time
+            self.frames_sent += 1
+
+            now = time.monotonic()
+            if now - stats_logged >= STATS_INTERVAL:
+                stats_logged = now
+                logger.debug(f"Display transport {self.stats()}")
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Every power of two range is split into 2 ** SUB_BUCKET_BITS linear buckets
+SUB_BUCKET_BITS = 3
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+# Latencies above 2 ** MAX_BITS ns (~18 min) land in the last bucket
+MAX_BITS = 40
+BUCKETS = (MAX_BITS - SUB_BUCKET_BITS + 1) * SUB_BUCKETS
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+_histograms = {}
+
+_counters = {}
+
+
+def bucket_index(value):
+    bits = value.bit_length()
+    if bits <= SUB_BUCKET_BITS:
+        return value
+    if bits > MAX_BITS:
+        return BUCKETS - 1
+    shift = bits - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_value(index):
+    """Lowest value falling into the bucket"""
+    if index < SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return (index % SUB_BUCKETS + SUB_BUCKETS) << shift
+
+
+class LatencyHistogram:
+    """Log-linear histogram of nanosecond latencies in preallocated buckets.
+
+    Values are kept with 1/8 relative precision, like HDR histograms with
+    a single significant digit.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._counts = [0] * BUCKETS
+        self.reset()
+
+    def reset(self):
+        for index in range(BUCKETS):
+            self._counts[index] = 0
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        # bucket_index inlined, this runs once per routed message
+        bits = value.bit_length()
+        if bits <= SUB_BUCKET_BITS:
+            index = value
+        elif bits > MAX_BITS:
+            index = BUCKETS - 1
+        else:
+            shift = bits - SUB_BUCKET_BITS - 1
+            index = (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+        self._counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def min(self):
+        for index, count in enumerate(self._counts):
+            if count:
+                return bucket_value(index)
+        return 0
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0
+        threshold = self.count * percent / 100
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if count and seen >= threshold:
+                # highest value of the bucket, conservative for latency goals
+                return min(bucket_value(index + 1) - 1, self.max)
+        return self.max
+
+    def snapshot(self):
+        """Summary in microseconds"""
+        summary = {
+            "count": self.count,
+            "min": self.min / 1000,
+            "mean": self.total / (self.count or 1) / 1000,
+            "max": self.max / 1000,
+        }
+        for percent in PERCENTILES:
+            summary[f"p{percent:g}"] = self.percentile(percent) / 1000
+        return summary
+
+
+class Counter:
+    """Number of events like dropped or merged messages"""
+
+    value = 0
+
+    def __init__(self, name):
+        self.name = name
+
+    def add(self, count=1):
+        self.value += count
+
+    def reset(self):
+        self.value = 0
+
+
+class Gauge(Counter):
+    """Last set value like a queue depth"""
+
+    def set(self, value):
+        self.value = value
+
+
+def histogram(name):
+    """Histogram registered under the name, created on first use"""
+    instance = _histograms.get(name)
+    if instance is None:
+        instance = _histograms[name] = LatencyHistogram(name)
+    return instance
+
+
+def counter(name):
+    """Counter registered under the name, created on first use"""
+    instance = _counters.get(name)
+    if instance is None:
+        instance = _counters[name] = Counter(name)
+    return instance
+
+
+def gauge(name):
+    """Gauge registered under the name, created on first use"""
+    instance = _counters.get(name)
+    if instance is None:
+        instance = _counters[name] = Gauge(name)
+    return instance
+
+
+def snapshot():
+    """Histogram summaries and counter values by name"""
+    summary = {name: instance.snapshot() for name, instance in _histograms.items()}
+    for name, instance in _counters.items():
+        summary[name] = instance.value
+    return summary
+
+
+def reset():
+    for instance in _histograms.values():
+        instance.reset()
+    for instance in _counters.values():
+        instance.reset()
+
+
+async def log_periodically(interval):
+    """Log one line per histogram and counter every interval seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        for name, instance in _counters.items():
+            if instance.value:
+                logger.info(f"{name} {instance.value}")
+        for name, instance in _histograms.items():
+            summary = instance.snapshot()
+            if not summary["count"]:
+                continue
+            logger.info(
+                f"{name} n={summary['count']} p50={summary['p50']:.1f}us "
+                f"p99={summary['p99']:.1f}us p99.9={summary['p99.9']:.1f}us "
+                f"max={summary['max']:.1f}us"
+            )
+
+
+async def _handle_client(reader, writer):
+    try:
+        command = (await reader.readline()).strip()
+        writer.write(json.dumps(snapshot()).encode() + b"\n")
+        if command == b"reset":
+            reset()
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(path):
+    """Answer every connection on a unix socket with a json snapshot.
+
+    A client sending a "reset" line resets all metrics after the snapshot.
+    """
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(_handle_client, path=path)
+    logger.info(f"Serving metrics on {path}")
+    return server
@@ -0,0 +1,36 @@
+# Status bytes of channel messages indexed by channel
+NOTE_OFF = tuple(0x80 | channel for channel in range(16))
+NOTE_ON = tuple(0x90 | channel for channel in range(16))
+POLYTOUCH = tuple(0xA0 | channel for channel in range(16))
+CONTROL_CHANGE = tuple(0xB0 | channel for channel in range(16))
+PROGRAM_CHANGE = tuple(0xC0 | channel for channel in range(16))
+AFTERTOUCH = tuple(0xD0 | channel for channel in range(16))
+PITCHWHEEL = tuple(0xE0 | channel for channel in range(16))
+
+STATUS_BYTES = {
+    "note_off": NOTE_OFF,
+    "note_on": NOTE_ON,
+    "polytouch": POLYTOUCH,
+    "control_change": CONTROL_CHANGE,
+    "program_change": PROGRAM_CHANGE,
+    "aftertouch": AFTERTOUCH,
+    "pitchwheel": PITCHWHEEL,
+}
+
+# Status bytes of system messages
+SYSTEM_STATUS_BYTES = {
+    "sysex": 0xF0,
+    "quarter_frame": 0xF1,
+    "songpos": 0xF2,
+    "song_select": 0xF3,
+    "tune_request": 0xF6,
+    "clock": 0xF8,
+    "start": 0xFA,
+    "continue": 0xFB,
+    "stop": 0xFC,
+    "active_sensing": 0xFE,
+    "reset": 0xFF,
+}
+
+# Message types carrying a note number as first data byte
+NOTE_MESSAGE_TYPES = ("note_off", "note_on", "polytouch")
@@ -0,0 +1,121 @@
+import logging
+import mmap
+import os
+import select
+
+logger = logging.getLogger(__name__)
+
+# Every slot keeps a length byte and up to three message bytes
+SLOT_SIZE = 4
+
+# 32 bit counters, single stores of them are atomic on 32 bit arm too.
+# They live on separate cache lines and are written by one side each.
+HEAD = 0
+TAIL = 16
+HEADER_SIZE = 128
+
+COUNTER_MASK = 0xFFFFFFFF
+
+# Wake up bytes, one per message put and one to stop the consumer
+MESSAGE = 0
+STOP = 1
+
+
+class MessageRing:
+    """Single producer single consumer ring of midi messages in shared memory.
+
+    Created before forking worker processes so both sides map the same pages,
+    producer and consumer then live in different processes. Python has no
+    memory barriers, so the producer writes a byte into a pipe for every
+    message after storing it and the consumer only reads as many slots as it
+    read bytes. The pipe is locked in the kernel on both ends, which orders
+    the slot stores before the consumer's loads on weakly ordered cpus like
+    arm. Messages longer than three bytes like sysex are dropped, as are
+    messages put into a full ring.
+    """
+
+    SLOTS = 1024
+
+    _running = False
+
+    # messages dropped by the producer of this process
+    dropped = 0
+
+    def __init__(self, slots=None):
+        self.slots = slots or self.SLOTS
+        # slot indices stay continuous when the counters wrap around
+        if self.slots & (self.slots - 1):
+            raise ValueError(f"Ring slots {self.slots} not a power of two")
+        self._memory = mmap.mmap(-1, HEADER_SIZE + self.slots * SLOT_SIZE)
+        self._counters = memoryview(self._memory)[:HEADER_SIZE].cast("I")
+        self._data = memoryview(self._memory)[HEADER_SIZE:]
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        os.set_blocking(self._wake_write, False)
+
+    @property
+    def depth(self):
+        return (self._counters[HEAD] - self._counters[TAIL]) & COUNTER_MASK
+
+    def put(self, data):
+        size = len(data)
+        counters = self._counters
+        head = counters[HEAD]
+        depth = (head - counters[TAIL]) & COUNTER_MASK
+        if size >= SLOT_SIZE or depth >= self.slots:
+            self.dropped += 1
+            return False
+
+        offset = (head % self.slots) * SLOT_SIZE
+        self._data[offset] = size
+        self._data[offset + 1 : offset + 1 + size] = bytes(data)
+        try:
+            # publishes the slot, the consumer never reads past its bytes
+            os.write(self._wake_write, b"\0")
+        except BlockingIOError:
+            self.dropped += 1
+            return False
+        counters[HEAD] = (head + 1) & COUNTER_MASK
+        return True
+
+    def _published(self, timeout=None):
+        """Number of messages published since the last call"""
+        if timeout != 0:
+            select.select([self._wake_read], [], [], timeout)
+        try:
+            wakes = os.read(self._wake_read, self.slots + 1)
+        except BlockingIOError:
+            return 0
+        if STOP in wakes:
+            self._running = False
+        return wakes.count(MESSAGE)
+
+    def skip(self):
+        """Drop messages left over, called by a restarted consumer"""
+        skipped = self._published(timeout=0)
+        self._counters[TAIL] = (self._counters[TAIL] + skipped) & COUNTER_MASK
+
+    def consume(self, callback):
+        """Call back with the bytes of every message until stopped"""
+        self._running = True
+        counters = self._counters
+        data = self._data
+        slots = self.slots
+        while self._running:
+            published = self._published()
+            tail = counters[TAIL]
+            for _ in range(published):
+                offset = (tail % slots) * SLOT_SIZE
+                message = bytes(data[offset + 1 : offset + 1 + data[offset]])
+                tail = (tail + 1) & COUNTER_MASK
+                counters[TAIL] = tail
+                try:
+                    callback(message)
+                except Exception:
+                    logger.exception("Failed to deliver a ring message")
+
+    def stop(self):
+        try:
+            os.write(self._wake_write, bytes([STOP]))
+        except BlockingIOError:
+            self._running = False
@@ -1,6 +1,12 @@
 import logging
 
 from asyncio import Event
+from time import monotonic_ns
+
+from midirouter import metrics, trace
+from midirouter.routers.coalesce import apply_coalescing
+from midirouter.routers.realtime import RealtimeForwarder
+from midirouter.routers.rules import compile_rules
 
 logger = logging.getLogger(__name__)
 
@@ -10,19 +16,76 @@ class BaseRouter:
     _in_device = None
     _out_devices = None
 
-    def __init__(self, in_device, out_devices):
+    # router specific options from the route config
+    _options = None
+
+    # actions for every status byte compiled from the route rules
+    _dispatch = None
+
+    # in to out latency histograms per out device
+    _latencies = None
+
+    # realtime fast path, enabled by the realtime option
+    _realtime = None
+
+    # latest value only senders per out device, enabled by the coalesce option
+    _coalescers = ()
+
+    def __init__(self, in_device, out_devices, options=None, rules=None, route=None):
         self._in_device = in_device
         self._out_devices = out_devices
+        self._options = options or {}
+        self.route = route or type(self).__name__
+        self._latencies = [
+            metrics.histogram(f"{self.route}/{out_device.label}")
+            for out_device in out_devices
+        ]
+        self._dispatch = compile_rules(rules, out_devices, self._latencies)
+
+        realtime = self._options.get("realtime")
+        if realtime is not None:
+            self._realtime = RealtimeForwarder(
+                self.route, self._dispatch, pll=realtime.get("pll", False)
+            )
+
+        coalesce = self._options.get("coalesce")
+        if coalesce is not None:
+            self._coalescers = apply_coalescing(
+                self._dispatch, out_devices, coalesce, self.route
+            )
 
     async def run(self):
-        self._in_device.add_callback(self.on_message)
+        self.subscribe()
         await self.wait()
 
+    def subscribe(self):
+        if self._realtime is not None:
+            self._in_device.add_realtime_callback(self._realtime.on_message)
+            self._realtime.start()
+        self._in_device.add_callback(
+            trace.traced(self.on_message, f"{type(self).__name__} in")
+        )
+
     async def wait(self):
         await Event().wait()
 
+    @property
+    def devices(self):
+        return [self._in_device, *self._out_devices]
+
+    def stop(self):
+        """Stop forwarding before the route is torn down on reload"""
+        if self._realtime is not None:
+            self._realtime.stop()
+        for coalescer in self._coalescers:
+            coalescer.flush()
+
     def on_message(self, message):
-        if message.type != "clock":
-            logger.info(message)
-        for out_device in self._out_devices:
-            out_device.send(message)
+        data = message.bytes()
+        received_ns = self._in_device.received_ns
+        for send, transform, latency in self._dispatch[data[0]]:
+            routed = data if transform is None else transform(data)
+            if routed is None:
+                continue
+            send(routed)
+            latency.record(monotonic_ns() - received_ns)
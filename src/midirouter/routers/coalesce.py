@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import threading
+from time import monotonic_ns
+
+from midirouter import metrics
+from midirouter.midi import STATUS_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Message types coalesced unless the route config lists others
+DEFAULT_TYPES = ("control_change", "pitchwheel")
+
+# Message types whose first data byte is part of the coalescing key
+KEYED_TYPES = ("control_change", "polytouch")
+
+# Default upper bound of messages per second per controller
+DEFAULT_RATE = 100
+
+
+class Coalescer:
+    """Keeps only the latest value per controller of one output.
+
+    The first message of a controller goes out immediately, further ones
+    within the flush interval replace each other and only the latest is sent
+    by the next flush, or once the out queue drains. Other messages pass
+    straight through but flush the pending controllers first, keeping e.g.
+    sustain pedal and notes in order.
+    """
+
+    _flush_scheduled = False
+
+    def __init__(self, send, rate, coalesced):
+        self._send = send
+        self._interval_ns = int(1e9 / rate)
+        self._coalesced = coalesced
+        self._pending = {}
+        self._sent_ns = {}
+        self._lock = threading.Lock()
+        self._loop = asyncio.get_event_loop()
+
+    @property
+    def coalesced(self):
+        return self._coalesced.value
+
+    def send(self, data):
+        if self._pending:
+            self.flush()
+        self._send(data)
+
+    def send_keyed(self, data):
+        self._put(data[0] << 8 | data[1], data)
+
+    def send_latest(self, data):
+        self._put(data[0] << 8, data)
+
+    def _put(self, key, data):
+        now = monotonic_ns()
+        with self._lock:
+            if key in self._pending:
+                self._pending[key] = data
+                self._coalesced.add()
+                return
+
+            wait_ns = self._sent_ns.get(key, 0) + self._interval_ns - now
+            if wait_ns <= 0:
+                self._sent_ns[key] = now
+                self._send(data)
+                return
+
+            self._pending[key] = data
+            if not self._flush_scheduled:
+                self._flush_scheduled = True
+                self._loop.call_soon_threadsafe(
+                    self._loop.call_later, wait_ns / 1e9, self.flush
+                )
+
+    def flush(self):
+        """Send the latest pending value of every controller"""
+        now = monotonic_ns()
+        with self._lock:
+            self._flush_scheduled = False
+            for key, data in self._pending.items():
+                self._sent_ns[key] = now
+                self._send(data)
+            self._pending.clear()
+
+
+def apply_coalescing(dispatch, out_devices, options, route):
+    """Route the sends of a compiled dispatch table through coalescers.
+
+    Returns the coalescers per out device, options are the coalesce object
+    of the route config.
+    """
+    rate = options.get("rate", DEFAULT_RATE)
+    types = options.get("types", DEFAULT_TYPES)
+    for msg_type in types:
+        if msg_type not in STATUS_BYTES:
+            raise ValueError(f"Can not coalesce {msg_type} messages")
+
+    coalescers = {}
+    for out_device in out_devices:
+        coalescer = Coalescer(
+            out_device.send_bytes,
+            rate,
+            metrics.counter(f"{route}/{out_device.label}/coalesced"),
+        )
+        # queued outputs get the latest values as soon as they catch up
+        out_device.add_drain_callback(coalescer.flush)
+        coalescers[out_device.send_bytes] = coalescer
+
+    sends = {}
+    for msg_type, statuses in STATUS_BYTES.items():
+        for status in statuses:
+            if msg_type not in types:
+                sends[status] = "send"
+            elif msg_type in KEYED_TYPES:
+                sends[status] = "send_keyed"
+            else:
+                sends[status] = "send_latest"
+
+    for status, actions in enumerate(dispatch):
+        method = sends.get(status, "send")
+        dispatch[status] = tuple(
+            (getattr(coalescers[send], method), transform, latency)
+            for send, transform, latency in actions
+        )
+
+    logger.info(f"{route} coalesces {', '.join(types)} at {rate} per second")
+    return list(coalescers.values())
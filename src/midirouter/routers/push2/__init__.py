@@ -1,28 +1,48 @@
 import asyncio
 import logging
+from time import monotonic_ns
 
-import mido
-
+from midirouter import metrics, trace
+from midirouter.midi import STATUS_BYTES
 from midirouter.routers.base import BaseRouter
 from midirouter.device.display import Push2Display
 from midirouter.routers.push2.pages.chord import Push2ChordPage
+from midirouter.routers.push2.scheduler import RenderScheduler
 
 logger = logging.getLogger(__name__)
 
 
 class Push2Router(BaseRouter):
 
+    # display implementation, replaced by in-memory sinks in benchmarks
+    DISPLAY_CLASS = Push2Display
+
     _display_connected = False
     _display_page = None
     _display = None
+    _scheduler = None
+
+    _build_latency = None
+    _show_latency = None
 
     async def run(self):
-        self._display = Push2Display(
+        self._build_latency = metrics.histogram(f"{self.route}/build")
+        self._show_latency = metrics.histogram(f"{self.route}/show")
+
+        display_options = self._options.get("display", {})
+        self._scheduler = RenderScheduler(
+            self.render_frame,
+            max_fps=display_options.get("max_fps"),
+            keepalive=display_options.get("keepalive"),
+        )
+        self._display = self.DISPLAY_CLASS(
             on_connected=self.on_display_connected,
             on_disconnected=self.on_display_disconnected,
         )
         self._display_page = Push2ChordPage(
-            self._in_device, on_midi_out=self.on_midi_out
+            self._in_device,
+            on_midi_out=trace.traced(self.on_midi_out, "push2 out"),
+            on_invalidate=self._scheduler.wake,
         )
         self._display_page.initialize()
 
@@ -34,26 +54,30 @@ class Push2Router(BaseRouter):
     def on_display_connected(self):
         """Callback when push 2 display is initialized"""
         self._display_connected = True
-        asyncio.create_task(self.display_loop())
+        asyncio.create_task(self._scheduler.run())
 
     def on_display_disconnected(self):
         """Callback when push 2 display is disconnected"""
         self._display_connected = False
+        self._scheduler.stop()
+
+    def stop(self):
+        if self._display is not None:
+            self._display.disconnect()
+        super().stop()
 
-    async def display_loop(self):
-        while self._display_connected:
-            frame = self._display_page.build()
-            self._display.show(frame)
+    def render_frame(self):
+        started = monotonic_ns()
+        frame = self._display_page.build()
+        built = monotonic_ns()
+        self._display.show(frame)
+        self._build_latency.record(built - started)
+        self._show_latency.record(monotonic_ns() - built)
 
     def on_midi_out(self, msg_type, velocity, notes, channel=None):
-        logger.info(f"{msg_type} {notes}")
-        for out_device in self._out_devices:
-            for note in notes:
-                out_device.send(
-                    mido.Message(
-                        type=msg_type,
-                        channel=out_device.channel or channel,
-                        note=note,
-                        velocity=velocity,
-                    )
-                )
+        statuses = STATUS_BYTES[msg_type]
+        received_ns = self._in_device.received_ns
+        for out_device, latency in zip(self._out_devices, self._latencies):
+            status = statuses[out_device.channel or channel or 0]
+            out_device.send_notes(status, notes, velocity)
+            latency.record(monotonic_ns() - received_ns)
@@ -1,12 +1,14 @@
+from time import monotonic_ns
+
 import cairo
 import numpy
 
-HEIGHT = 160
-WIDTH = 960
-DISPLAY_LINE_FILLER_BYTES = 128
-NP_DISPLAY_FRAME_XOR_PATTERN = numpy.array(
-    [0xE7F3, 0xE7FF] * (((WIDTH + (DISPLAY_LINE_FILLER_BYTES // 2)) * HEIGHT) // 2),
-    dtype=numpy.uint16,
+from midirouter import metrics
+from midirouter.device.encoder import (
+    HEIGHT,
+    LINE_WIDTH,
+    WIDTH,
+    Push2FrameEncoder,
 )
 
 
@@ -20,12 +22,59 @@ class Push2Page:
     # callback to send midi notes outes
     _on_midi_out = None
 
-    def __init__(self, device, on_midi_out):
+    # callback notified when the page needs to be redrawn
+    _on_invalidate = None
+
+    _encoder = None
+
+    # surface rendering straight into the encoder line buffer
+    _surface = None
+
+    def __init__(self, device, on_midi_out, on_invalidate=None):
         self._device = device
         self._on_midi_out = on_midi_out
+        self._on_invalidate = on_invalidate
+        self._encoder = Push2FrameEncoder()
+
+    def invalidate(self):
+        """Mark the page as changed so the next frame redraws it"""
+        if self._on_invalidate:
+            self._on_invalidate()
 
-    def get_surface(self):
-        return cairo.ImageSurface(cairo.FORMAT_RGB16_565, WIDTH, HEIGHT)
+    def get_surface(self, clear=True):
+        """Surface reused across frames.
+
+        Its stride matches the 2048 byte display line so the encoder consumes
+        the rendered pixels without copying them.
+        """
+        if self._surface is None:
+            self._surface = cairo.ImageSurface.create_for_data(
+                self._encoder.lines,
+                cairo.FORMAT_RGB16_565,
+                WIDTH,
+                HEIGHT,
+                LINE_WIDTH * 2,
+            )
+        elif clear:
+            self._surface.flush()
+            self._encoder.lines[:, :WIDTH] = 0
+            self._surface.mark_dirty()
+
+        return self._surface
+
+    def compose(self, layers):
+        """Build a frame repainting only the layers whose key changed.
+
+        Layers are (layer, key) pairs and must not overlap, unchanged
+        regions keep the pixels of the previous frame.
+        """
+        surface = self.get_surface(clear=False)
+        ctx = None
+        for layer, key in layers:
+            if layer.update(key):
+                ctx = ctx or cairo.Context(surface)
+                layer.paint(ctx)
+        return self.prepare(surface)
 
     @staticmethod
     def rgb565_to_bgr565(rgb565_frame):
@@ -48,20 +97,16 @@ class Push2Page:
             frame_r_shifted + frame_g_shifted + frame_b_shifted
         )  # Combine all channels
 
-    def prepare(self, buffer):
+    def prepare(self, surface):
+        """Convert a cairo surface into a display frame.
 
-        frame = numpy.ndarray(
-            shape=(self.HEIGHT, self.WIDTH), dtype=numpy.uint16, buffer=buffer
-        )
-        frame = frame.transpose()
-
-        width = WIDTH + DISPLAY_LINE_FILLER_BYTES // 2
-        height = HEIGHT
-        prepared_frame = numpy.zeros(shape=(width, height), dtype=numpy.uint16)
-        prepared_frame[0 : frame.shape[0], 0 : frame.shape[1]] = frame
-        prepared_frame = prepared_frame.transpose().flatten()
-        prepared_frame = self.rgb565_to_bgr565(prepared_frame)
-        prepared_frame = prepared_frame.byteswap()  # Change to little endian
-        prepared_frame = numpy.bitwise_xor(prepared_frame, NP_DISPLAY_FRAME_XOR_PATTERN)
-
-        return prepared_frame.byteswap().tobytes()
+        The returned memoryview is reused by the next frame.
+        """
+        started = monotonic_ns()
+        surface.flush()
+        if surface is self._surface:
+            frame = self._encoder.encode_lines()
+        else:
+            frame = self._encoder.encode(surface.get_data())
+        metrics.histogram("push2/prepare").record(monotonic_ns() - started)
+        return frame
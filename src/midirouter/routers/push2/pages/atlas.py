@@ -0,0 +1,38 @@
+import cairo
+
+from midirouter import scales
+
+# (name, octave) for every midi note number
+NOTE_NAMES = tuple(
+    (scales.NOTE_NAMES[midi_note % 12], str(midi_note // 12 - 1))
+    for midi_note in range(128)
+)
+
+
+class Push2GlyphAtlas:
+    """Labels pre-rendered into tiles and blitted instead of shaping text.
+
+    Tiles are rendered on first use by the draw callback, which receives a
+    context with its origin at the tile corner and the tile key.
+    """
+
+    def __init__(self, width, height, draw):
+        self.width = width
+        self.height = height
+        self._draw = draw
+        self._tiles = {}
+
+    def get(self, key):
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = cairo.ImageSurface(cairo.FORMAT_RGB16_565, self.width, self.height)
+            ctx = cairo.Context(tile)
+            self._draw(ctx, key)
+            tile.flush()
+            self._tiles[key] = tile
+        return tile
+
+    def blit(self, ctx, key, x, y):
+        ctx.set_source_surface(self.get(key), x, y)
+        ctx.rectangle(x, y, self.width, self.height)
+        ctx.fill()
@@ -1,13 +1,19 @@
 import logging
 
 import cairo
-from music_essentials import Note, Scale
 
+from midirouter import scales, trace
 from midirouter.device.push2 import Push2Colors
 from midirouter.routers.push2.pages import Push2Page
+from midirouter.routers.push2.pages.atlas import NOTE_NAMES, Push2GlyphAtlas
+from midirouter.routers.push2.pages.layers import Push2Layer
 
 logger = logging.getLogger(__name__)
 
+FONT_FACE = cairo.ToyFontFace(
+    "Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL
+)
+
 
 class Push2ChordPage(Push2Page):
 
@@ -55,9 +61,24 @@ class Push2ChordPage(Push2Page):
         "inv": 1,
     }
 
+    # bit of every modifier name in a modifier mask
+    MODIFIER_BITS = {name: 1 << idx for idx, name in enumerate(MODIFIER_COLORS)}
+
+    # memoized chords above this size reset the memo
+    CHORD_MEMO_SIZE = 4096
+
     _octave = 1
     _modifiers = [False] * 16
-    _prev_modifiers = [False] * 16
+
+    # modifier names currently held as a bit mask
+    _modifier_mask = 0
+    _prev_modifier_mask = 0
+
+    # (note index, modifier mask) -> (chord, chord type, modifier a, modifier b)
+    _chord_memo = None
+
+    # chord memos of every (root, scale name) used so far
+    _chord_memos = None
 
     # when true modifiers work in a toggle mode
     _latch_mode = False
@@ -87,8 +108,22 @@ class Push2ChordPage(Push2Page):
 
     _modifier_name: str = ""
 
+    # cached page layers
+    _header_layer = None
+    _notes_layer = None
+    _footer_layer = None
+
+    # pre-rendered labels of playing notes
+    _note_labels = None
+
     def initialize(self):
-        self._device.add_callback(self.on_message)
+        self._chord_memos = {}
+        self._note_labels = Push2GlyphAtlas(100, 90, self.draw_note_label)
+        self._header_layer = Push2Layer(0, 0, self.WIDTH, 40, self.draw_header)
+        self._notes_layer = Push2Layer(0, 40, self.WIDTH, 90, self.draw_notes)
+        self._footer_layer = Push2Layer(0, 130, self.WIDTH, 30, self.draw_footer)
+
+        self._device.add_callback(trace.traced(self.on_message, "push2 page in"))
         self.initialize_controls()
         self.initialize_scales()
         self.initialize_pads()
@@ -96,32 +131,69 @@ class Push2ChordPage(Push2Page):
         self.set_scale(20)
 
     def initialize_controls(self):
-        self._device.highlight_control(54)
-        self._device.highlight_control(55)
+        self._device.paint_layout(
+            controls=dict.fromkeys((54, 55, 44, 45), Push2Colors.DARK_GRAY)
+        )
 
     def initialize_scales(self):
-        for cc, name in self.SCALES.items():
-            self._device.highlight_control(cc)
+        self._device.paint_layout(
+            controls=dict.fromkeys(self.SCALES, Push2Colors.DARK_GRAY)
+        )
 
     def initialize_pads(self):
-        for i in range(36, 84):
-            self._device.highlight_pad(i, self.get_pad_default_color(i))
+        self._device.paint_layout(
+            pads={i: self.get_pad_default_color(i) for i in range(36, 84)}
+        )
 
     def initialize_modifiers(self):
-        for pad, name in self.MODIFIERS.items():
-            self._device.highlight_pad(pad, self.MODIFIER_COLORS[name])
+        self._device.paint_layout(
+            pads={
+                pad: self.MODIFIER_COLORS[name] for pad, name in self.MODIFIERS.items()
+            }
+        )
 
-    def build_chord(self, note_index, modifiers):
-        self._chord_type = ""
-        self._chord_modifier_a = ""
-        self._chord_modifier_b = ""
+    def get_modifier_mask(self, modifiers):
+        mask = 0
+        for idx, state in enumerate(modifiers):
+            if state:
+                mask |= self.MODIFIER_BITS[self.MODIFIERS[idx + 84]]
+        return mask
+
+    def lookup_chord(self, note_index, modifier_mask):
+        """Memoized build_chord for the current scale"""
+        key = (note_index, modifier_mask)
+        entry = self._chord_memo.get(key)
+        if entry is None:
+            if len(self._chord_memo) >= self.CHORD_MEMO_SIZE:
+                self._chord_memo.clear()
+            names = {
+                name for name, bit in self.MODIFIER_BITS.items() if modifier_mask & bit
+            }
+            chord = self.build_chord_from_names(note_index, names)
+            entry = (
+                tuple(chord),
+                self._chord_type,
+                self._chord_modifier_a,
+                self._chord_modifier_b,
+            )
+            self._chord_memo[key] = entry
 
+        chord, self._chord_type, self._chord_modifier_a, self._chord_modifier_b = entry
+        return chord
+
+    def build_chord(self, note_index, modifiers):
         names = set(
             [self.MODIFIERS[idx + 84] for idx, state in enumerate(modifiers) if state]
         )
+        return self.build_chord_from_names(note_index, names)
+
+    def build_chord_from_names(self, note_index, names):
+        self._chord_type = ""
+        self._chord_modifier_a = ""
+        self._chord_modifier_b = ""
 
         if not names:
-            return [self._scale_notes[note_index]]
+            return self.playable([self._scale_notes[note_index]])
 
         # major chord
         names.add("triad")
@@ -204,32 +276,47 @@ class Push2ChordPage(Push2Page):
             chord[2] += 1
             chord[3] += 1
 
-        return chord
+        return self.playable(chord)
+
+    @staticmethod
+    def playable(chord):
+        """Chord notes within the midi note range"""
+        return [note for note in chord if note <= scales.HIGHEST_NOTE]
 
     def set_scale(self, index):
         self._scale_name = self.SCALES.get(index)
 
-        for scale_cc in self.SCALES.keys():
-            self._device.highlight_control(scale_cc, Push2Colors.DARK_GRAY)
-        self._device.highlight_control(index, Push2Colors.WHITE)
+        controls = dict.fromkeys(self.SCALES, Push2Colors.DARK_GRAY)
+        controls[index] = Push2Colors.WHITE
+        self._device.paint_layout(controls=controls)
 
-        self._scale_notes = []
-        self._scale_size = len(Scale._SCALE_PATTERNS[self._scale_name])
+        self.apply_scale()
 
-        scale = Scale.build_scale(
-            Note.from_note_string(f"{self._scale_root_note}0"),
-            self._scale_name,
-        )
-
-        self._scale_key_notes = [str(note) for note in scale][: self._scale_size]
+    def set_root(self, root):
+        self._scale_root_note = root
+        self.apply_scale()
 
-        for octave in range(-1, 9):
-            scale = Scale.build_scale(
-                Note.from_note_string(f"{self._scale_root_note}{octave}"),
-                self._scale_name,
+    def apply_scale(self):
+        """Switch notes and chords to the current root and scale name"""
+        # held pads map to other notes from now on, release what they play
+        if self._notes_playing:
+            self._on_midi_out(
+                msg_type="note_off", velocity=0, notes=self._notes_playing
             )
-            for idx in range(self._scale_size):
-                self._scale_notes.append(scale[idx].midi_note_number())
+        self._notes_pressed = set()
+        self._notes_playing = set()
+
+        key = (self._scale_root_note, self._scale_name)
+        self._scale_size = scales.scale_size(self._scale_name)
+        self._scale_notes = scales.scale_notes(*key)
+        self._scale_key_notes = scales.scale_key_notes(*key)
+        self._chord_memo = self._chord_memos.setdefault(key, {})
+        self.invalidate()
+
+    def on_root_message(self, message):
+        step = -1 if message.control == 44 else 1
+        root_index = scales.NOTE_NAMES.index(self._scale_root_note) + step
+        self.set_root(scales.NOTE_NAMES[root_index % 12])
 
     def on_scale_message(self, message):
         self._scale_index = message.control
@@ -266,14 +353,16 @@ class Push2ChordPage(Push2Page):
             if message.type == "note_off":
                 self._modifiers[index] = False
 
+        self._modifier_mask = self.get_modifier_mask(self._modifiers)
+
         to_play = set()
         to_stop = set()
 
         for note_index in self._notes_pressed:
-            last_chord = self.build_chord(note_index, self._prev_modifiers)
+            last_chord = self.lookup_chord(note_index, self._prev_modifier_mask)
             to_stop.update(set(last_chord) - {self._scale_notes[note_index]})
 
-            chord = self.build_chord(note_index, self._modifiers)
+            chord = self.lookup_chord(note_index, self._modifier_mask)
             to_play.update(set(chord) - {self._scale_notes[note_index]})
 
         to_stop -= to_play
@@ -297,8 +386,9 @@ class Push2ChordPage(Push2Page):
                 channel=message.channel,
             )
 
-        self._prev_modifiers = list(self._modifiers)
+        self._prev_modifier_mask = self._modifier_mask
         self._device.highlight_pad(message.note, pad_color)
+        self.invalidate()
 
     def on_note_message(self, message):
 
@@ -309,7 +399,7 @@ class Push2ChordPage(Push2Page):
         row = (pad_note - base) // 8
         col = (pad_note - base) % 8
         note_index = self._scale_size * row + col
-        chord = self.build_chord(note_index, self._modifiers)
+        chord = self.lookup_chord(note_index, self._modifier_mask)
 
         pad_color = Push2Colors.GREEN
         if message.type == "note_on":
@@ -318,6 +408,10 @@ class Push2ChordPage(Push2Page):
 
         if message.type == "note_off":
             pad_color = self.get_pad_default_color(pad_note)
+            if note_index not in self._notes_pressed:
+                # released already by a root or scale change
+                self._device.highlight_pad(message.note, pad_color)
+                return
             self._notes_pressed.remove(note_index)
             self._notes_playing -= set(chord)
 
@@ -328,6 +422,7 @@ class Push2ChordPage(Push2Page):
             notes=chord,
             channel=message.channel,
         )
+        self.invalidate()
 
     def on_latch_mode_message(self, message):
         self._latch_mode = not self._latch_mode
@@ -348,6 +443,9 @@ class Push2ChordPage(Push2Page):
                 if 54 <= message.control <= 55:
                     self.on_octave_message(message)
 
+                if 44 <= message.control <= 45:
+                    self.on_root_message(message)
+
             if message.type in ["note_on", "note_off"]:
                 if 84 <= message.note <= 99:
                     self.on_chord_modifier_message(message)
@@ -365,44 +463,39 @@ class Push2ChordPage(Push2Page):
             color = Push2Colors.LIGHT_GRAY
         return color
 
-    def build(self):
-
-        # Prepare cairo canvas
-        surface = self.get_surface()
-        ctx = cairo.Context(surface)
-
-        # Add text with encoder name and value
+    def draw_header(self, ctx, header):
+        root, chord_name = header
         ctx.set_source_rgb(1, 1, 1)
-        font_size = self.HEIGHT // 3
-
-        ctx.select_font_face("Arial", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
-
-        ctx.move_to(10, 30)
+        ctx.set_font_face(FONT_FACE)
         ctx.set_font_size(20)
-        ctx.show_text(
-            self._chord_modifier_a + self._chord_modifier_b + self._chord_type
-        )
+        ctx.move_to(10, 30)
+        ctx.show_text(chord_name)
 
-        for idx, midi_note in enumerate(sorted(self._notes_playing)):
-            ctx.set_font_size(40)
-            ctx.move_to(10 + idx * 100, 100)
-            note = Note.from_midi_num(midi_note)
-            accidental = note.accidental if note.accidental else ""
-            note_str = note.pitch + accidental
-            ctx.show_text(note_str)
+        ctx.move_to(self.WIDTH - 50, 30)
+        ctx.show_text(root)
 
-            ctx.set_font_size(10)
-            ctx.move_to(15 + 25 * len(note_str) + idx * 100, 80)
-            ctx.show_text(str(note.octave))
+    def draw_note_label(self, ctx, midi_note):
+        """Draw a note label into its atlas tile at the notes layer origin"""
+        note_str, octave = NOTE_NAMES[midi_note]
+        ctx.set_source_rgb(1, 1, 1)
+        ctx.set_font_face(FONT_FACE)
+        ctx.set_font_size(40)
+        ctx.move_to(10, 60)
+        ctx.show_text(note_str)
+
+        ctx.set_font_size(10)
+        ctx.move_to(15 + 25 * len(note_str), 40)
+        ctx.show_text(octave)
 
-        # if self._notes_pressed:
-        #     for idx, note_index in enumerate(self._notes_pressed.copy()):
-        #         note = str(Note.from_midi_num(self._scale_notes[note_index]))
-        #         ctx.move_to(10 + idx * 200, font_size * 2)
+    def draw_notes(self, ctx, notes):
+        for idx, midi_note in enumerate(notes):
+            self._note_labels.blit(ctx, midi_note, idx * 100, 40)
 
+    def draw_footer(self, ctx, active_scale_index):
+        ctx.set_font_face(FONT_FACE)
         ctx.set_font_size(14)
         for scale_index, scale_name in self.SCALES.items():
-            if scale_index == self._scale_index:
+            if scale_index == active_scale_index:
                 ctx.set_source_rgb(1, 1, 1)
             else:
                 ctx.set_source_rgb(0.4, 0.4, 0.4)
@@ -410,4 +503,19 @@ class Push2ChordPage(Push2Page):
             ctx.move_to(10 + 122 * (scale_index - 20), 150)
             ctx.show_text(scale_name)
 
-        return self.prepare(surface.get_data())
+    def build(self):
+        return self.compose(
+            (
+                (
+                    self._header_layer,
+                    (
+                        self._scale_root_note,
+                        self._chord_modifier_a
+                        + self._chord_modifier_b
+                        + self._chord_type,
+                    ),
+                ),
+                (self._notes_layer, tuple(sorted(self._notes_playing))),
+                (self._footer_layer, self._scale_index),
+            )
+        )
@@ -0,0 +1,47 @@
+import cairo
+
+
+class Push2Layer:
+    """Page region rendered into its own cached surface.
+
+    The layer is re-rendered only when its key changes. The key is passed to
+    the draw callback, which uses page coordinates.
+    """
+
+    # sentinel never equal to any key so the first update always renders
+    _NOT_RENDERED = object()
+
+    def __init__(self, x, y, width, height, draw):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self._draw = draw
+        self._key = self._NOT_RENDERED
+        self._surface = cairo.ImageSurface(cairo.FORMAT_RGB16_565, width, height)
+
+    def update(self, key):
+        """Re-render the cached surface if the key changed, True if it did"""
+        if key == self._key:
+            return False
+
+        self._key = key
+        ctx = cairo.Context(self._surface)
+        ctx.set_source_rgb(0, 0, 0)
+        ctx.paint()
+        ctx.translate(-self.x, -self.y)
+        self._draw(ctx, key)
+        self._surface.flush()
+        return True
+
+    def invalidate(self):
+        self._key = self._NOT_RENDERED
+
+    def paint(self, ctx):
+        """Copy the cached surface into its region of the page"""
+        ctx.save()
+        ctx.set_operator(cairo.OPERATOR_SOURCE)
+        ctx.set_source_surface(self._surface, self.x, self.y)
+        ctx.rectangle(self.x, self.y, self.width, self.height)
+        ctx.fill()
+        ctx.restore()
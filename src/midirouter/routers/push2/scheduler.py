@@ -0,0 +1,72 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RenderScheduler:
+    """Redraws the display only when the page state changes."""
+
+    # upper bound of frames pushed to the display per second
+    DEFAULT_MAX_FPS = 30
+
+    # seconds between redraws when nothing changes, push 2 blanks
+    # the display if it does not receive a frame for two seconds
+    DEFAULT_KEEPALIVE = 1.0
+
+    _loop = None
+    _dirty = None
+    _running = False
+
+    # callable producing and sending a single frame
+    _render = None
+
+    # number of frames rendered since start
+    frames = 0
+
+    def __init__(self, render, max_fps=None, keepalive=None):
+        self._render = render
+        self.max_fps = max_fps or self.DEFAULT_MAX_FPS
+        self.keepalive = keepalive or self.DEFAULT_KEEPALIVE
+
+    def wake(self):
+        """Request a redraw. Safe to call from any thread."""
+        if self._loop is None or self._dirty.is_set():
+            return
+        self._loop.call_soon_threadsafe(self._dirty.set)
+
+    def stop(self):
+        self._running = False
+        self.wake()
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._dirty = asyncio.Event()
+        self._dirty.set()
+        self._running = True
+
+        min_interval = 1.0 / self.max_fps
+        logger.info(
+            f"Render scheduler started max_fps={self.max_fps} "
+            f"keepalive={self.keepalive}"
+        )
+
+        while self._running:
+            try:
+                await asyncio.wait_for(self._dirty.wait(), self.keepalive)
+            except asyncio.TimeoutError:
+                pass
+
+            if not self._running:
+                break
+
+            self._dirty.clear()
+            started = self._loop.time()
+            self._render()
+            self.frames += 1
+
+            # always yield to the loop and never exceed max fps
+            elapsed = self._loop.time() - started
+            await asyncio.sleep(max(min_interval - elapsed, 0))
+
+        logger.info("Render scheduler stopped")
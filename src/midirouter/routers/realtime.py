@@ -0,0 +1,233 @@
+import logging
+import threading
+from collections import deque
+from time import monotonic_ns
+
+from midirouter import metrics
+from midirouter.midi import SYSTEM_STATUS_BYTES
+
+logger = logging.getLogger(__name__)
+
+CLOCK = SYSTEM_STATUS_BYTES["clock"]
+START = SYSTEM_STATUS_BYTES["start"]
+CONTINUE = SYSTEM_STATUS_BYTES["continue"]
+STOP = SYSTEM_STATUS_BYTES["stop"]
+
+# Realtime messages forwarded on the fast path
+REALTIME_STATUS_BYTES = (CLOCK, START, CONTINUE, STOP)
+
+CLOCKS_PER_BEAT = 24
+
+# Longer gaps between ticks restart tempo tracking, slower than 10 BPM
+MAX_TICK_INTERVAL = 250_000_000
+
+
+class ClockStats:
+    """Tempo and inter tick jitter of an incoming midi clock"""
+
+    # Weight of a new interval in the smoothed tick period
+    SMOOTHING = 0.05
+
+    # Smoothed tick period in ns, 0 until two ticks arrived
+    period_ns = 0
+
+    last_ns = 0
+
+    ticks = 0
+
+    def __init__(self, name):
+        self._jitter = metrics.histogram(f"{name}/clock_jitter")
+        self._period = metrics.histogram(f"{name}/clock_period")
+
+    def tick(self, received_ns):
+        self.ticks += 1
+        interval = received_ns - self.last_ns
+        self.last_ns = received_ns
+        if interval > MAX_TICK_INTERVAL:
+            return
+
+        self._period.record(interval)
+        if self.period_ns:
+            self._jitter.record(abs(interval - int(self.period_ns)))
+            self.period_ns += (interval - self.period_ns) * self.SMOOTHING
+        else:
+            self.period_ns = interval
+
+    def reset(self):
+        self.last_ns = 0
+
+    @property
+    def bpm(self):
+        if not self.period_ns:
+            return 0.0
+        return 60e9 / (self.period_ns * CLOCKS_PER_BEAT)
+
+
+class ClockRegenerator:
+    """Sends clock ticks from its own thread, phase locked to the input clock.
+
+    Input ticks pass through until the tick period is known. From then on
+    every input tick schedules one output tick at its smoothed time plus a
+    small fixed latency, hiding input jitter up to that latency while
+    keeping the number of ticks exact.
+    """
+
+    # Weight of a new input interval in the tick period
+    PERIOD_GAIN = 0.05
+
+    # Part of the phase error corrected per input tick
+    PHASE_GAIN = 0.1
+
+    # Added to the smoothed tick times, input jitter below it is removed
+    LATENCY_NS = 2_000_000
+
+    # Input ticks passed through before the output locks
+    LOCK_TICKS = 4
+
+    period_ns = 0
+
+    # Monotonic ns the next input tick is expected at, 0 while not locked
+    expected_ns = 0
+
+    last_input_ns = 0
+
+    _locking = 0
+
+    _running = False
+
+    def __init__(self, send):
+        self._send = send
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._schedule = deque()
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="clock-regenerator", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+    def reset(self):
+        with self._lock:
+            self.expected_ns = 0
+            self.last_input_ns = 0
+            self._locking = 0
+            self._schedule.clear()
+
+    def tick(self, received_ns):
+        with self._lock:
+            interval = received_ns - self.last_input_ns
+            self.last_input_ns = received_ns
+            if interval > MAX_TICK_INTERVAL:
+                self.expected_ns = 0
+                self._locking = 0
+
+            if not self.expected_ns:
+                self._send(CLOCK)
+                if interval <= MAX_TICK_INTERVAL:
+                    self.period_ns = interval
+                    self._locking += 1
+                if self._locking >= self.LOCK_TICKS:
+                    self.expected_ns = received_ns + self.period_ns
+                return
+
+            smoothed_ns = (
+                self.expected_ns + (received_ns - self.expected_ns) * self.PHASE_GAIN
+            )
+            self.period_ns += (interval - self.period_ns) * self.PERIOD_GAIN
+            self.expected_ns = smoothed_ns + self.period_ns
+            self._schedule.append(int(smoothed_ns) + self.LATENCY_NS)
+        self._wake.set()
+
+    def _run(self):
+        while self._running:
+            self._wake.clear()
+            with self._lock:
+                next_ns = self._schedule[0] if self._schedule else 0
+            if not next_ns:
+                self._wake.wait()
+                continue
+
+            # sleep only, a busy wait would hold the GIL the midi threads need,
+            # a new input tick or stop wakes it early
+            delay = next_ns - monotonic_ns()
+            if delay > 0:
+                self._wake.wait(delay / 1e9)
+                continue
+
+            with self._lock:
+                if self._schedule:
+                    self._schedule.popleft()
+                    self._send(CLOCK)
+
+
+class RealtimeForwarder:
+    """Forwards single byte realtime messages ahead of the router.
+
+    Called from the midi thread with the status byte only, no message gets
+    parsed. Outputs are taken from the compiled route rules and the
+    forwarded statuses are removed from the regular dispatch table.
+    """
+
+    _regenerator = None
+
+    def __init__(self, route, dispatch, pll=False):
+        self.route = route
+        self._routes = {}
+        self._messages = {}
+        for status in REALTIME_STATUS_BYTES:
+            self._routes[status] = tuple(
+                (send, latency) for send, transform, latency in dispatch[status]
+            )
+            self._messages[status] = [status]
+            dispatch[status] = ()
+
+        self.clock = ClockStats(route)
+        if pll:
+            self._regenerator = ClockRegenerator(self.send_clock)
+
+    def start(self):
+        if self._regenerator is not None:
+            self._regenerator.start()
+
+    def stop(self):
+        if self._regenerator is not None:
+            self._regenerator.stop()
+
+    def send_clock(self, status):
+        data = self._messages[status]
+        for send, latency in self._routes[status]:
+            send(data)
+
+    def on_message(self, status, received_ns):
+        routes = self._routes.get(status)
+        if routes is None:
+            return
+
+        if status == CLOCK:
+            self.clock.tick(received_ns)
+            if self._regenerator is not None:
+                self._regenerator.tick(received_ns)
+                return
+        elif status == STOP:
+            logger.info(f"{self.route} clock stopped at {self.clock.bpm:.1f} BPM")
+            self.clock.reset()
+            # ticks scheduled before stop must not follow it
+            if self._regenerator is not None:
+                self._regenerator.reset()
+        elif status == START and self._regenerator is not None:
+            self._regenerator.reset()
+
+        data = self._messages[status]
+        for send, latency in routes:
+            send(data)
+            latency.record(monotonic_ns() - received_ns)
+
+    def stats(self):
+        return {"bpm": self.clock.bpm, "ticks": self.clock.ticks}
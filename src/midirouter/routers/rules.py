@@ -0,0 +1,88 @@
+import logging
+
+from midirouter.midi import NOTE_MESSAGE_TYPES, STATUS_BYTES, SYSTEM_STATUS_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Forward everything unchanged to every output
+DEFAULT_RULES = [{}]
+
+
+def _status_types():
+    """(status byte, message type, channel) of every known status"""
+    for msg_type, statuses in STATUS_BYTES.items():
+        for channel, status in enumerate(statuses):
+            yield status, msg_type, channel
+    for msg_type, status in SYSTEM_STATUS_BYTES.items():
+        yield status, msg_type, None
+
+
+def _compile_transform(rule, msg_type, status):
+    """Function rewriting message bytes, None when bytes pass unchanged.
+
+    The function returns None for messages the rule drops.
+    """
+    channel = rule.get("channel")
+    transpose = rule.get("transpose", 0)
+    note_range = rule.get("notes")
+
+    out_status = status
+    if channel is not None and msg_type in STATUS_BYTES:
+        out_status = STATUS_BYTES[msg_type][channel]
+
+    if msg_type not in NOTE_MESSAGE_TYPES:
+        transpose = 0
+        note_range = None
+
+    if out_status == status and not transpose and not note_range:
+        return None
+
+    low, high = note_range or (0, 127)
+
+    def transform(data):
+        note = data[1]
+        if note < low or note > high:
+            return None
+        note += transpose
+        if note < 0 or note > 127:
+            return None
+        return [out_status, note, *data[2:]]
+
+    return transform
+
+
+def compile_rules(rules, out_devices, latencies):
+    """Compile route rules into a dispatch table indexed by status byte.
+
+    Every entry is a tuple of (send, transform, latency) actions, send takes
+    the message bytes, transform is None or rewrites them per the rule and
+    latency is the histogram of the output, latencies are per out device.
+    """
+    table = [[] for _ in range(256)]
+
+    known_types = set(STATUS_BYTES) | set(SYSTEM_STATUS_BYTES)
+
+    for rule in rules or DEFAULT_RULES:
+        types = rule.get("types")
+        if not types and ("notes" in rule or "transpose" in rule):
+            # note ranges and transposition only make sense for notes
+            types = NOTE_MESSAGE_TYPES
+        for msg_type in types or ():
+            if msg_type not in known_types:
+                raise ValueError(f"Unknown message type {msg_type} in route rule")
+        channels = rule.get("channels")
+        indices = rule.get("out") or range(len(out_devices))
+
+        for status, msg_type, channel in _status_types():
+            if types and msg_type not in types:
+                continue
+            if channels is not None and channel not in channels:
+                continue
+
+            transform = _compile_transform(rule, msg_type, status)
+            for idx in indices:
+                table[status].append(
+                    (out_devices[idx].send_bytes, transform, latencies[idx])
+                )
+
+    return [tuple(actions) for actions in table]
@@ -0,0 +1,66 @@
+from functools import lru_cache
+
+NOTE_NAMES = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+
+# Scale steps in semitones
+SCALE_PATTERNS = {
+    "major": (2, 2, 1, 2, 2, 2, 1),
+    "minor": (2, 1, 2, 2, 1, 2, 2),
+    "natural minor": (2, 1, 2, 2, 1, 2, 2),
+    "harmonic minor": (2, 1, 2, 2, 1, 3, 1),
+    "melodic minor": (2, 1, 2, 2, 2, 2, 1),
+    "dorian": (2, 1, 2, 2, 2, 1, 2),
+    "phrygian": (1, 2, 2, 2, 1, 2, 2),
+    "lydian": (2, 2, 2, 1, 2, 2, 1),
+    "mixolydian": (2, 2, 1, 2, 2, 1, 2),
+    "locrian": (1, 2, 2, 1, 2, 2, 2),
+    "major pentatonic": (2, 2, 3, 2, 3),
+    "minor pentatonic": (3, 2, 2, 3, 2),
+}
+
+# Octaves covered by scale note tables
+LOWEST_OCTAVE = -1
+HIGHEST_OCTAVE = 8
+
+# Highest midi note, tables of roots above G reach past it in the top octave
+HIGHEST_NOTE = 127
+
+
+def note_number(root, octave):
+    """Midi note number of a root name in an octave, C-1 is 0"""
+    return (octave + 1) * 12 + NOTE_NAMES.index(root)
+
+
+def note_name(midi_note):
+    return f"{NOTE_NAMES[midi_note % 12]}{midi_note // 12 - 1}"
+
+
+def scale_size(scale_name):
+    return len(SCALE_PATTERNS[scale_name])
+
+
+@lru_cache(maxsize=None)
+def scale_offsets(scale_name):
+    """Semitone offsets of the scale degrees from the root"""
+    offsets = [0]
+    for step in SCALE_PATTERNS[scale_name][:-1]:
+        offsets.append(offsets[-1] + step)
+    return tuple(offsets)
+
+
+@lru_cache(maxsize=None)
+def scale_notes(root, scale_name):
+    """Midi note numbers of every scale degree from the lowest octave up"""
+    offsets = scale_offsets(scale_name)
+    return tuple(
+        note_number(root, octave) + offset
+        for octave in range(LOWEST_OCTAVE, HIGHEST_OCTAVE + 1)
+        for offset in offsets
+    )
+
+
+@lru_cache(maxsize=None)
+def scale_key_notes(root, scale_name):
+    """Note names of a single octave of the scale starting at octave 0"""
+    base = note_number(root, 0)
+    return tuple(note_name(base + offset) for offset in scale_offsets(scale_name))
@@ -0,0 +1,166 @@
+import logging
+import multiprocessing
+import multiprocessing.connection
+import signal
+import time
+
+from midirouter.device.remote import DeviceLink
+
+logger = logging.getLogger(__name__)
+
+
+def device_key(device_conf):
+    """Identifies a device across routes of the config"""
+    return device_conf.get("pattern") or device_conf.get("name")
+
+
+def plan_links(config):
+    """Message rings linking routes to devices owned by other routes.
+
+    The first route using a device opens it, any other route reaches it
+    through a DeviceLink. Returns per route the links of remote devices
+    and the links the route serves for its own devices, both by device key.
+    """
+    owners = {}
+    for route, route_conf in config.items():
+        for device_conf in [route_conf["in"], *route_conf["out"]]:
+            owners.setdefault(device_key(device_conf), route)
+
+    links = {route: {"remote": {}, "served": {}} for route in config}
+    for route, route_conf in config.items():
+        for device_conf in [route_conf["in"], *route_conf["out"]]:
+            key = device_key(device_conf)
+            owner = owners[key]
+            if owner == route or key in links[route]["remote"]:
+                continue
+            link = DeviceLink(key)
+            links[route]["remote"][key] = link
+            links[owner]["served"].setdefault(key, []).append(link)
+            logger.info(f"Route {route} reaches {key} through {owner}")
+    return links
+
+
+class Worker:
+    """Worker process running a single route"""
+
+    process = None
+
+    started = 0
+
+    restarts = 0
+
+    # Monotonic seconds the crashed worker is restarted at
+    restart_at = None
+
+    def __init__(self, name, target, args):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.delay = Supervisor.RESTART_DELAY
+
+
+class Supervisor:
+    """Runs every route in its own worker process, restarting crashed ones.
+
+    Workers are forked so they inherit the shared memory rings, restarts back
+    off exponentially unless the worker ran long enough to count as stable.
+    """
+
+    RESTART_DELAY = 1.0
+
+    RESTART_DELAY_MAX = 30.0
+
+    # Seconds a worker has to run for its restart delay to reset
+    STABLE_AFTER = 60.0
+
+    def __init__(self):
+        self._context = multiprocessing.get_context("fork")
+        self._workers = {}
+
+    def add(self, name, target, *args):
+        self._workers[name] = Worker(name, target, args)
+
+    def start(self, worker):
+        worker.restart_at = None
+        worker.started = time.monotonic()
+        worker.process = self._context.Process(
+            target=self._run_worker,
+            args=(worker.target, worker.args),
+            name=f"route {worker.name}",
+        )
+        worker.process.start()
+        logger.info(f"Started worker {worker.name} pid {worker.process.pid}")
+
+    @staticmethod
+    def _run_worker(target, args):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        target(*args)
+
+    def on_exit(self, worker):
+        exitcode = worker.process.exitcode
+        uptime = time.monotonic() - worker.started
+        if uptime > self.STABLE_AFTER:
+            worker.delay = self.RESTART_DELAY
+        logger.error(
+            f"Worker {worker.name} exited with {exitcode} after {uptime:.1f}s, "
+            f"restarting in {worker.delay:.1f}s"
+        )
+        worker.restarts += 1
+        worker.restart_at = time.monotonic() + worker.delay
+        worker.delay = min(worker.delay * 2, self.RESTART_DELAY_MAX)
+        worker.process = None
+
+    def stop(self, *args):
+        raise SystemExit(0)
+
+    def on_hangup(self, *args):
+        # the default action would leave the workers without a supervisor
+        logger.warning("Config reload is not available with workers, ignored")
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGHUP, self.on_hangup)
+        for worker in self._workers.values():
+            self.start(worker)
+
+        try:
+            while True:
+                self._supervise()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.terminate()
+
+    def _supervise(self):
+        running = {
+            worker.process.sentinel: worker
+            for worker in self._workers.values()
+            if worker.process is not None
+        }
+        pending = [
+            worker.restart_at
+            for worker in self._workers.values()
+            if worker.restart_at is not None
+        ]
+        timeout = max(min(pending) - time.monotonic(), 0) if pending else None
+
+        for sentinel in multiprocessing.connection.wait(list(running), timeout):
+            worker = running[sentinel]
+            worker.process.join()
+            self.on_exit(worker)
+
+        now = time.monotonic()
+        for worker in self._workers.values():
+            if worker.restart_at is not None and worker.restart_at <= now:
+                self.start(worker)
+
+    def terminate(self):
+        for worker in self._workers.values():
+            if worker.process is not None:
+                worker.process.terminate()
+        for worker in self._workers.values():
+            if worker.process is not None:
+                worker.process.join()
+        logger.info("Workers stopped")
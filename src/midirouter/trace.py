@@ -0,0 +1,108 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Message types recorded only once per sample rate messages
+SAMPLED_TYPES = frozenset(
+    (
+        "clock",
+        "active_sensing",
+        "control_change",
+        "pitchwheel",
+        "aftertouch",
+        "polytouch",
+    )
+)
+
+# Active tracer, None while tracing is disabled
+_tracer = None
+
+
+class MessageTracer:
+    """Keeps the last events in a preallocated ring buffer.
+
+    Recording stores references only, events are formatted when dumped.
+    """
+
+    def __init__(self, size=1024, sample_rate=1):
+        self.size = size
+        self.sample_rate = max(sample_rate, 1)
+        self._times = [0] * size
+        self._sources = [None] * size
+        self._events = [None] * size
+        self._index = 0
+        self._sampled = 0
+        self.recorded = 0
+
+    def record(self, source, event):
+        if getattr(event, "type", None) in SAMPLED_TYPES:
+            self._sampled += 1
+            if self._sampled % self.sample_rate:
+                return
+
+        index = self._index
+        self._times[index] = time.monotonic_ns()
+        self._sources[index] = source
+        self._events[index] = event
+        self._index = (index + 1) % self.size
+        self.recorded += 1
+
+    def events(self):
+        """Recorded (time ns, source, event) from oldest to newest"""
+        count = min(self.recorded, self.size)
+        start = (self._index - count) % self.size
+        for offset in range(count):
+            index = (start + offset) % self.size
+            yield self._times[index], self._sources[index], self._events[index]
+
+    def dump(self, path=None):
+        lines = [
+            f"{timestamp / 1e9:.6f} {source} {event}"
+            for timestamp, source, event in self.events()
+        ]
+        if path:
+            with open(path, "w") as f:
+                f.write("\n".join(lines) + "\n")
+            logger.info(f"Dumped {len(lines)} trace events to {path}")
+            return
+
+        logger.info(f"Trace of last {len(lines)} of {self.recorded} events")
+        for line in lines:
+            logger.info(line)
+
+
+def enable(size=1024, sample_rate=1):
+    global _tracer
+    _tracer = MessageTracer(size=size, sample_rate=sample_rate)
+    logger.info(f"Tracing last {size} events, sampling 1/{sample_rate}")
+    return _tracer
+
+
+def get_tracer():
+    return _tracer
+
+
+def traced(callback, source):
+    """Wrap a callback to record its first argument or keyword arguments.
+
+    While tracing is disabled the callback is returned as is, so the hot path
+    carries no tracing code at all. Wrap callbacks after enable().
+    """
+    if _tracer is None:
+        return callback
+
+    record = _tracer.record
+
+    def wrapper(*args, **kwargs):
+        record(source, args[0] if args else kwargs)
+        return callback(*args, **kwargs)
+
+    return wrapper
+
+
+def dump(path=None):
+    if _tracer is None:
+        logger.warning("Tracing is disabled")
+        return
+    _tracer.dump(path)
@@ -1,3 +1,5 @@
+import importlib
+
 import mido
 
 
@@ -7,3 +9,9 @@ def get_in_ports():
 
 def get_out_ports():
     return mido.get_output_names()
+
+
+def import_class(path):
+    """Class from its dotted path, importing the module on first use"""
+    module_name, _, class_name = path.rpartition(".")
+    return getattr(importlib.import_module(module_name), class_name)
@@ -14,6 +14,18 @@ if __name__ == "__main__":
 
     parser.add_argument("--config", help="Router config")
 
+    parser.add_argument(
+        "--batch", help="Compile every changed config of this directory"
+    )
+
+    parser.add_argument(
+        "--jobs", type=int, help="Batch worker processes, one per cpu by default"
+    )
+
+    parser.add_argument(
+        "--force", action="store_true", help="Compile unchanged configs too"
+    )
+
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     asyncio.run(MPDApplication().run(options=parser.parse_args()))
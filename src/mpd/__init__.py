@@ -1,6 +1,10 @@
+import hashlib
+import importlib.metadata
 import logging
 import os
 import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 import construct as C
@@ -19,6 +23,9 @@ _DIALS = 6
 _DBANKS = 3
 _DTOTAL = _DIALS * _DBANKS
 
+# Content hashes of compiled configs kept by batch runs, next to the configs
+MANIFEST = "mpd218.manifest"
+
 # --------------------------------------------------
 # Define file format using Construct (v2.9)
 # https://github.com/construct/construct
@@ -161,12 +168,18 @@ class MPDApplication:
         }
 
     async def run(self, options=None):
-
         current_dir = os.path.dirname(os.path.realpath(__file__))
-        config_file = f"{current_dir}/mpd/" + options.config
-        with open(config_file) as f:
-            conf = json.loads(f.read())
+        if options.batch:
+            self.compile_directory(
+                f"{current_dir}/{options.batch}",
+                jobs=options.jobs,
+                force=options.force,
+            )
+        else:
+            self.compile(f"{current_dir}/{options.config}")
 
+    def build(self, conf):
+        """Preset sysex dump built from a preset config"""
         pad_template = conf["template"]["pad"]
         dial_template = conf["template"]["dial"]
 
@@ -233,7 +246,7 @@ class MPDApplication:
             for bank_index, bank_name in enumerate(["a", "b", "c"])
         ]
 
-        mpd = Mpd218.build(
+        return Mpd218.build(
             [
                 header,
                 pad_banks,
@@ -242,12 +255,126 @@ class MPDApplication:
             ]
         )
 
-        # print(Mpd218.parse(mpd))
-        # print(json.dumps(pad_banks, indent=4))
-        # print(json.dumps(dial_banks, indent=4))
-        # print(mpd)
+    def compile(self, config_file):
+        """Write the preset of a config next to it, returns the preset file"""
+        with open(config_file) as f:
+            conf = json.loads(f.read())
 
-        basename = Path(config_file).stem
-        mpd_file = f"{current_dir}/mpd/{basename}.mpd218"
+        mpd_file = Path(config_file).with_suffix(".mpd218")
         with open(mpd_file, "wb+") as f:
-            f.write(mpd)
+            f.write(self.build(conf))
+        return mpd_file
+
+    def compile_directory(self, directory, jobs=None, force=False):
+        """Compile every preset config of the directory on a process pool.
+
+        Configs whose content and compiler are unchanged since the last run,
+        as recorded in the manifest, are skipped unless forced.
+        """
+        started = time.perf_counter()
+        directory = Path(directory)
+        manifest = Manifest(directory / MANIFEST)
+        results = {}
+
+        pending = {}
+        for config_file in sorted(directory.glob("*.json")):
+            data = config_file.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()
+            try:
+                conf = json.loads(data)
+            except ValueError:
+                logger.exception(f"Failed to read {config_file.name}")
+                results[config_file.name] = ("failed", 0)
+                continue
+
+            if "name" not in conf:
+                # fragments like template.json are no presets
+                results[config_file.name] = ("no preset", 0)
+            elif not force and manifest.unchanged(config_file, digest):
+                results[config_file.name] = ("unchanged", 0)
+            else:
+                pending[config_file] = digest
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(compile_config, config_file): config_file
+                for config_file in pending
+            }
+            for future in as_completed(futures):
+                config_file = futures[future]
+                try:
+                    elapsed = future.result()
+                except Exception:
+                    logger.exception(f"Failed to compile {config_file.name}")
+                    manifest.forget(config_file)
+                    results[config_file.name] = ("failed", 0)
+                    continue
+                manifest.update(config_file, pending[config_file])
+                results[config_file.name] = ("compiled", elapsed)
+
+        manifest.save(directory.glob("*.json"))
+        compiled = 0
+        for name in sorted(results):
+            status, elapsed = results[name]
+            compiled += status == "compiled"
+            print(f"{name:<40}{status:<12}{elapsed * 1000:>10.1f}ms")
+        print(
+            f"{compiled} of {len(results)} configs compiled in "
+            f"{(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+        return results
+
+
+def compile_config(config_file):
+    """Compile a single config in a pool worker, returns seconds taken"""
+    started = time.perf_counter()
+    MPDApplication().compile(config_file)
+    return time.perf_counter() - started
+
+
+def compiler_version():
+    """Changes whenever presets compiled from the same config may change.
+
+    Scales come from music_essentials, the rest of the preset from this module.
+    """
+    digest = hashlib.sha256(Path(__file__).read_bytes())
+    try:
+        digest.update(importlib.metadata.version("music_essentials").encode())
+    except importlib.metadata.PackageNotFoundError:
+        pass
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Content hashes of the configs compiled by the last batch run"""
+
+    def __init__(self, path):
+        self.path = path
+        self.version = compiler_version()
+        self.files = {}
+        try:
+            with open(path) as f:
+                manifest = json.loads(f.read())
+        except (OSError, ValueError):
+            return
+        if manifest.get("version") == self.version:
+            self.files = manifest["files"]
+
+    def unchanged(self, config_file, digest):
+        return (
+            self.files.get(config_file.name) == digest
+            and config_file.with_suffix(".mpd218").exists()
+        )
+
+    def update(self, config_file, digest):
+        self.files[config_file.name] = digest
+
+    def forget(self, config_file):
+        self.files.pop(config_file.name, None)
+
+    def save(self, config_files):
+        """Write the manifest, dropping configs no longer in the directory"""
+        names = {config_file.name for config_file in config_files}
+        files = {name: digest for name, digest in self.files.items() if name in names}
+        with open(self.path, "w") as f:
+            f.write(json.dumps({"version": self.version, "files": files}, indent=4))
@@ -2,14 +2,16 @@ import os
 import json
 import argparse
 import logging
+import signal
+import time
 
 import asyncio
 
-from midirouter.device.general import GeneralMidiDevice
-from midirouter.device.push2 import Push2Device
-from midirouter.routers.base import BaseRouter
-from midirouter.routers.push2 import Push2Router
-from midirouter.utils import get_in_ports, get_out_ports
+from midirouter import metrics, trace
+from midirouter.device.ports import PortIndex, PortPool
+from midirouter.device.remote import serve_remote
+from midirouter.supervisor import Supervisor, device_key, plan_links
+from midirouter.utils import get_in_ports, get_out_ports, import_class
 
 
 logging.basicConfig(
@@ -18,20 +20,114 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def route_devices(route_conf):
+    """Keys of the devices a route uses"""
+    return {device_key(conf) for conf in [route_conf["in"], *route_conf["out"]]}
+
+
 class RouterApplication:
     """Application entry point."""
 
     routers = None
 
-    def create_device(self, name, pattern, channel):
-        device_class = {"general": GeneralMidiDevice, "push2": Push2Device}.get(
-            name, GeneralMidiDevice
+    # Ports shared by devices of all routes
+    ports = None
+
+    # Config of every running or starting route
+    routes = None
+
+    # Tasks of routes waiting for their devices and of running routes
+    _starting = None
+    _running = None
+
+    # Config of every running route
+    _started = None
+
+    # Seconds a reload waits for new routes to connect their devices, routes
+    # waiting longer for ports keep waiting in the background
+    RELOAD_TIMEOUT = 2.0
+
+    # Duration of the last config reload in ms
+    reload_ms = None
+
+    # Classes by config name, imported once a config uses them so routes
+    # without a Push 2 do not load cairo, numpy and usb
+    DEVICE_CLASSES = {
+        "general": "midirouter.device.general.GeneralMidiDevice",
+        "push2": "midirouter.device.push2.Push2Device",
+    }
+    REMOTE_DEVICE_CLASSES = {
+        "general": "midirouter.device.remote.RemoteMidiDevice",
+        "push2": "midirouter.device.remote.RemotePush2Device",
+    }
+    ROUTER_CLASSES = {
+        "base": "midirouter.routers.base.BaseRouter",
+        "push2": "midirouter.routers.push2.Push2Router",
+    }
+
+    def create_device(
+        self, name, pattern, channel, dispatch=None, queue=None, link=None
+    ):
+        if link is not None:
+            classes = self.REMOTE_DEVICE_CLASSES
+            device_class = import_class(classes.get(name, classes["general"]))
+            return device_class(
+                pattern=pattern,
+                channel=channel,
+                dispatch=dispatch,
+                queue=queue,
+                link=link,
+            )
+
+        classes = self.DEVICE_CLASSES
+        device_class = import_class(classes.get(name, classes["general"]))
+        return device_class(
+            pattern=pattern, channel=channel, dispatch=dispatch, queue=queue
         )
-        return device_class(pattern=pattern, channel=channel)
 
-    def create_router(self, name, in_device, out_devices):
-        router_class = {"base": BaseRouter, "push2": Push2Router}.get(name, BaseRouter)
-        return router_class(in_device=in_device, out_devices=out_devices)
+    def create_router(
+        self, name, in_device, out_devices, options=None, rules=None, route=None
+    ):
+        classes = self.ROUTER_CLASSES
+        router_class = import_class(classes.get(name, classes["base"]))
+        return router_class(
+            in_device=in_device,
+            out_devices=out_devices,
+            options=options,
+            rules=rules,
+            route=route,
+        )
+
+    def config_file(self, name):
+        current_dir = os.path.dirname(os.path.realpath(__file__))
+        return f"{current_dir}/midirouter/data/{name}"
+
+    def read_config(self, name):
+        with open(self.config_file(name)) as f:
+            return json.loads(f.read())
+
+    async def setup(self, options, worker=None):
+        """Tracing and metrics, suffixed by the route name in worker processes"""
+        suffix = f".{worker}" if worker else ""
+
+        if options.trace:
+            trace.enable(size=options.trace, sample_rate=options.trace_sample)
+            trace_file = options.trace_file and f"{options.trace_file}{suffix}"
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGUSR1, trace.dump, trace_file
+            )
+
+        if options.metrics_interval:
+            asyncio.create_task(metrics.log_periodically(options.metrics_interval))
+
+        if options.metrics_socket:
+            await metrics.serve(f"{options.metrics_socket}{suffix}")
+
+    async def open_ports(self):
+        port_index = PortIndex()
+        await port_index.refresh()
+        self.ports = PortPool(port_index)
+        asyncio.create_task(self.ports.monitor())
 
     async def run(self, options=None):
 
@@ -40,38 +136,252 @@ class RouterApplication:
             logger.info("List of output ports {}".format(get_out_ports()))
             return
 
-        # read config file
+        await self.setup(options)
+
         self.routers = {}
-        current_dir = os.path.dirname(os.path.realpath(__file__))
-        config_file = f"{current_dir}/midirouter/data/{options.config}"
-        with open(config_file) as f:
-            config = json.loads(f.read())
+        self.routes = {}
+        self._starting = {}
+        self._running = {}
+        self._started = {}
+        config = self.read_config(options.config)
+        await self.open_ports()
 
-        router_futures = []
         for router_name, route_conf in config.items():
-            in_device = self.create_device(
-                name=route_conf["in"].get("name"),
-                pattern=route_conf["in"].get("pattern"),
-                channel=None,
+            self.add_route(router_name, route_conf)
+
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGHUP, lambda: asyncio.create_task(self.reload(options))
+        )
+        if options.watch_config:
+            asyncio.create_task(self.watch_config(options))
+
+        await asyncio.Event().wait()
+
+    def add_route(self, router_name, route_conf, ready=None):
+        """Start the route in its own task, replacing a route of that name"""
+        starting = self._starting.get(router_name)
+        if starting is not None:
+            starting.cancel()
+
+        self.routes[router_name] = route_conf
+        task = asyncio.create_task(
+            self.start_route(router_name, route_conf, ready=ready)
+        )
+        task.add_done_callback(self.on_route_done)
+        self._starting[router_name] = task
+
+    def restore_route(self, router_name, route_conf):
+        """Config of the running route back in place of one failing to build"""
+        if self.routes.get(router_name) is not route_conf:
+            return
+        self._starting.pop(router_name, None)
+        if router_name in self._started:
+            self.routes[router_name] = self._started[router_name]
+        else:
+            del self.routes[router_name]
+
+    def on_route_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Route failed", exc_info=task.exception())
+
+    def stop_route(self, router_name):
+        """Stop the running route, its held notes are released"""
+        starting = self._starting.pop(router_name, None)
+        if starting is not None and starting is not asyncio.current_task():
+            starting.cancel()
+
+        router = self.routers.pop(router_name, None)
+        if router is None:
+            return
+        self._started.pop(router_name)
+        self._running.pop(router_name).cancel()
+        router.stop()
+        for device in router.devices:
+            device.disconnect(self.ports)
+        logger.info(f"Route {router_name} stopped")
+
+    async def reload(self, options):
+        """Apply config changes, only changed routes are rebuilt.
+
+        New routes connect their devices before changed and removed routes
+        stop, so ports used by both stay open.
+        """
+        started = time.perf_counter()
+        try:
+            config = self.read_config(options.config)
+        except (OSError, ValueError):
+            logger.exception("Failed to read config, keeping running routes")
+            return
+
+        removed = [name for name in self.routes if name not in config]
+        changed = [
+            name
+            for name, route_conf in config.items()
+            if self.routes.get(name) != route_conf
+        ]
+        if not removed and not changed:
+            logger.info("Config unchanged")
+            return
+
+        # removed routes sharing devices with new ones stop once those run
+        shared = set()
+        for router_name in changed:
+            shared |= route_devices(config[router_name])
+        handover = []
+        for router_name in removed:
+            if route_devices(self.routes.pop(router_name)) & shared:
+                handover.append(router_name)
+            else:
+                self.stop_route(router_name)
+
+        loop = asyncio.get_running_loop()
+        ready = []
+        for router_name in changed:
+            ready.append(loop.create_future())
+            self.add_route(router_name, config[router_name], ready=ready[-1])
+        done, waiting = await asyncio.wait(ready, timeout=self.RELOAD_TIMEOUT)
+
+        for router_name in handover:
+            if router_name not in self.routes:
+                self.stop_route(router_name)
+
+        failed = sum(1 for future in done if future.cancelled())
+        self.reload_ms = (time.perf_counter() - started) * 1000
+        metrics.gauge("reload_ms").set(self.reload_ms)
+        logger.info(
+            f"Reloaded config in {self.reload_ms:.1f}ms, "
+            f"{len(done) - failed} routes started, {len(removed)} removed, "
+            f"{failed} failed, {len(waiting)} waiting for ports"
+        )
+
+    async def watch_config(self, options):
+        """Reload the config whenever its file changes"""
+        config_file = self.config_file(options.config)
+        modified = os.stat(config_file).st_mtime_ns
+        while True:
+            await asyncio.sleep(options.watch_config)
+            try:
+                current = os.stat(config_file).st_mtime_ns
+            except OSError:
+                continue
+            if current != modified:
+                modified = current
+                await self.reload(options)
+
+    def supervise(self, options):
+        """Run every route in its own worker process restarted on crashes"""
+        config = self.read_config(options.config)
+        links = plan_links(config)
+
+        supervisor = Supervisor()
+        for router_name, route_conf in config.items():
+            supervisor.add(
+                router_name,
+                self.run_worker,
+                options,
+                router_name,
+                route_conf,
+                links[router_name],
             )
+        supervisor.run()
+
+    def run_worker(self, options, router_name, route_conf, links):
+        asyncio.run(self.run_route(options, router_name, route_conf, links))
+
+    async def run_route(self, options, router_name, route_conf, links):
+        await self.setup(options, worker=router_name)
+        self.routers = {}
+        self.routes = {}
+        self._starting = {}
+        self._running = {}
+        self._started = {}
+        await self.open_ports()
+        await self.start_route(router_name, route_conf, links)
+
+    async def start_route(self, router_name, route_conf, links=None, ready=None):
+        """Start a route as soon as its own devices are connected.
+
+        A running route of the same name is stopped once the devices are
+        connected, ready gets True as the route runs or is cancelled.
+        """
+        try:
+            router = await self.build_route(router_name, route_conf, links)
+        except BaseException as e:
+            if ready is not None:
+                ready.cancel()
+            # a route failing to build keeps running with its previous config
+            if not isinstance(e, asyncio.CancelledError):
+                self.restore_route(router_name, route_conf)
+            raise
+
+        self.stop_route(router_name)
+        self.routers[router_name] = router
+        self._running[router_name] = asyncio.current_task()
+        self._started[router_name] = route_conf
+        if ready is not None:
+            ready.set_result(True)
+        logger.info(f"Route {router_name} started")
+        await router.run()
+
+    async def build_route(self, router_name, route_conf, links=None):
+        """Devices of the route connected and its router.
 
-            out_devices = [
-                self.create_device(
-                    name=device_conf.pop("name"),
-                    pattern=device_conf.get("pattern"),
-                    channel=device_conf.get("channel"),
-                )
-                for device_conf in route_conf["out"]
-            ]
+        Links are given in worker processes, devices owned by other workers
+        are reached through them and owned devices are served to them.
+        """
+        remote = links["remote"] if links else {}
+        served = dict(links["served"]) if links else {}
 
+        in_conf = route_conf["in"]
+        in_device = self.create_device(
+            name=in_conf.get("name"),
+            pattern=in_conf.get("pattern"),
+            channel=None,
+            dispatch=in_conf.get("dispatch"),
+            link=remote.get(device_key(in_conf)),
+        )
+
+        out_devices = [
+            self.create_device(
+                name=device_conf.get("name"),
+                pattern=device_conf.get("pattern"),
+                channel=device_conf.get("channel"),
+                queue=device_conf.get("queue"),
+                link=remote.get(device_key(device_conf)),
+            )
+            for device_conf in route_conf["out"]
+        ]
+
+        connecting = [
+            asyncio.ensure_future(device.connect(self.ports))
+            for device in [in_device, *out_devices]
+        ]
+        try:
+            await asyncio.gather(*connecting)
             router = self.create_router(
                 name=route_conf.get("router"),
                 in_device=in_device,
                 out_devices=out_devices,
+                options=route_conf.get("options"),
+                rules=route_conf.get("rules"),
+                route=router_name,
             )
-            router_futures.append(router.run())
+        except BaseException:
+            # replaced or removed while waiting for its ports, or a bad config,
+            # devices still connecting would otherwise open ports after this
+            for task in connecting:
+                task.cancel()
+            await asyncio.gather(*connecting, return_exceptions=True)
+            for device in [in_device, *out_devices]:
+                device.disconnect(self.ports)
+            raise
 
-        await asyncio.gather(*router_futures)
+        devices = zip([in_conf, *route_conf["out"]], [in_device, *out_devices])
+        for device_conf, device in devices:
+            device_links = served.pop(device_key(device_conf), None)
+            if device_links:
+                serve_remote(device, device_links)
+        return router
 
 
 if __name__ == "__main__":
@@ -83,7 +393,53 @@ if __name__ == "__main__":
         "--list_ports", action="store_true", help="Show all midi in/out ports"
     )
 
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(
-        asyncio.gather(RouterApplication().run(options=parser.parse_args()))
+    parser.add_argument(
+        "--trace",
+        type=int,
+        default=0,
+        help="Keep last N routed messages, dumped on SIGUSR1",
+    )
+
+    parser.add_argument(
+        "--trace_sample",
+        type=int,
+        default=1,
+        help="Trace one of N clock, cc, pitchwheel and aftertouch messages",
+    )
+
+    parser.add_argument(
+        "--trace_file", help="Dump trace to this file instead of the log"
+    )
+
+    parser.add_argument(
+        "--metrics_interval",
+        type=float,
+        default=0,
+        help="Log latency percentiles every N seconds",
+    )
+
+    parser.add_argument(
+        "--metrics_socket", help="Serve latency histograms as json on a unix socket"
+    )
+
+    parser.add_argument(
+        "--watch_config",
+        type=float,
+        default=0,
+        help="Check the config file every N seconds and reload changed routes",
+    )
+
+    parser.add_argument(
+        "--workers",
+        action="store_true",
+        help="Run every route in its own supervised worker process",
     )
+
+    options = parser.parse_args()
+    if options.workers and not options.list_ports:
+        RouterApplication().supervise(options)
+    else:
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(
+            asyncio.gather(RouterApplication().run(options=options))
+        )